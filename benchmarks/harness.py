@@ -0,0 +1,173 @@
+"""Offline end-to-end benchmark of crawl.py and generate_html.py.
+
+Run from the repository root:
+
+    python -m benchmarks.harness [--locations 2] [--numbers 1-20] [--latency 20] [--bandwidth 0]
+
+A MockOrigin serves the fixtures locally, and each stage runs in its own child
+process inside a scratch directory, so peak RSS is measured per stage:
+
+    crawl          crawl.async_main over every (location, number)
+    scrape_page    crawl.crawl_all, the process-pool engine around scrape_page
+    download_media crawl.download_media, one file after another
+    generate_html  generate_html.build_site over the crawled tree
+
+Results are printed as a table and can be written as JSON with --json.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+
+from benchmarks.mock_origin import FIXTURES_DIR, MockOrigin, start_in_thread
+from benchmarks.record import parse_range
+
+DIR_LIST = [
+    "西門定點","中山定點","三重定點","板橋定點",
+    "蘆洲定點","信義定點","基隆定點","汐止定點",
+    "永和定點","中和定點","新店定點","樹林定點",
+]
+
+
+def tree_bytes(root):
+    """Bytes stored under root, counting hard-linked files once."""
+    seen = set()
+    total = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            stat = os.stat(os.path.join(directory, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def peak_rss_mib():
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024  # ru_maxrss is in KiB on Linux
+
+
+def run_stage(stage, workdir, base_url, locations, numbers):
+    """Runs one stage in the calling (child) process and returns its measurements."""
+    import crawl
+    import generate_html
+
+    os.chdir(workdir)
+    crawl.MEDIA_BASE_URL = base_url
+    start_number, end_number = numbers.start, numbers.stop - 1
+    pages = len(locations) * len(numbers)
+    result = {'stage': stage}
+
+    started = time.perf_counter()
+    if stage == 'crawl':
+        asyncio.run(crawl.async_main(base_url, locations, start_number, end_number,
+                                     requests_per_second=0, index_path=None))
+        result['pages'] = pages
+        result['bytes'] = tree_bytes('html')
+    elif stage == 'scrape_page':
+        crawl.crawl_all(base_url, locations, start_number, end_number, index_path=None)
+        result['pages'] = pages
+        result['bytes'] = tree_bytes('html')
+    elif stage == 'download_media':
+        os.makedirs('media', exist_ok=True)
+        links = []
+        for location in locations:
+            for number in numbers:
+                with open(os.path.join('pages', f'{location}-{number}.html'), encoding='utf-8') as f:
+                    post = crawl.extract_post(f.read(), crawl.generate_keywords(location, number)[0])
+                if post:
+                    links.extend(post['media'])
+        for link in dict.fromkeys(links):
+            crawl.download_media(link, 'media')
+        result['files'] = len(os.listdir('media'))
+        result['bytes'] = tree_bytes('media')
+    elif stage == 'generate_html':
+        generate_html.build_site(locations)
+        result['pages'] = len(locations)
+        result['bytes'] = sum(os.path.getsize(os.path.join('html', f'{location}.html')) for location in locations)
+    result['seconds'] = time.perf_counter() - started
+    result['peak_rss_mib'] = peak_rss_mib()
+    return result
+
+
+def save_result_pages(workdir, base_url, locations, numbers):
+    """Saves one result page per (location, number) for the download_media stage's link list."""
+    import requests
+    import crawl
+
+    os.makedirs(os.path.join(workdir, 'pages'), exist_ok=True)
+    with requests.Session() as session:
+        for location in locations:
+            for number in numbers:
+                keyword = crawl.generate_keywords(location, number)[0]
+                response = session.get(f"{base_url}?keyword={keyword}")
+                with open(os.path.join(workdir, 'pages', f'{location}-{number}.html'), 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+
+
+def in_child(*args):
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(run_stage, *args).result()
+
+
+def report(results):
+    print(f"{'stage':<16} {'seconds':>8} {'pages/s':>9} {'MB/s':>8} {'MB':>8} {'peak RSS MiB':>13}")
+    for result in results:
+        seconds = result['seconds']
+        pages = result.get('pages')
+        megabytes = result.get('bytes', 0) / 1e6
+        print(f"{result['stage']:<16} {seconds:>8.2f} "
+              f"{(pages / seconds if pages else 0):>9.1f} {megabytes / seconds:>8.1f} "
+              f"{megabytes:>8.1f} {result['peak_rss_mib']:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--locations', type=int, default=2, help='how many locations from DIR_LIST to crawl')
+    parser.add_argument('--numbers', type=parse_range, default=parse_range('1-20'))
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--latency', type=float, default=20, help='mock origin delay per request, in ms')
+    parser.add_argument('--bandwidth', type=float, default=0, help='mock origin KiB/s per response, 0 for none')
+    parser.add_argument('--media-size', type=int, default=2 * 1024 * 1024, help='synthetic media size in bytes')
+    parser.add_argument('--stages', nargs='+',
+                        default=['crawl', 'scrape_page', 'download_media', 'generate_html'])
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    origin = MockOrigin(args.fixtures, args.latency, args.bandwidth, media_size=args.media_size)
+    base_url = start_in_thread(origin)
+    locations = DIR_LIST[:args.locations]
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    with tempfile.TemporaryDirectory() as scratch:
+        crawl_dir = os.path.join(scratch, 'crawl')
+        os.makedirs(crawl_dir)
+        icon = os.path.join(repo_root, 'icon-play.png')
+        if os.path.exists(icon):
+            shutil.copy(icon, crawl_dir)
+        else:
+            open(os.path.join(crawl_dir, 'icon-play.png'), 'wb').close()
+
+        for stage in args.stages:
+            # Every stage but generate_html starts from an empty tree
+            workdir = crawl_dir if stage in ('crawl', 'generate_html') else tempfile.mkdtemp(dir=scratch)
+            if stage == 'download_media':
+                save_result_pages(workdir, base_url, locations, args.numbers)
+            results.append(in_child(stage, workdir, base_url, locations, args.numbers))
+
+    report(results)
+    print(f"mock origin: {origin.requests} requests, {origin.bytes_sent / 1e6:.1f} MB sent")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
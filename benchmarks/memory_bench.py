@@ -0,0 +1,41 @@
+"""Peak-memory benchmark for crawl.py's asyncio engine as the crawl grows.
+
+Run from the repository root:
+
+    python -m benchmarks.memory_bench [--sizes 1 3 6 12] [--numbers 1-40] [--latency 5]
+
+Crawls the first N locations of DIR_LIST from a MockOrigin for each N in
+--sizes, every run in a fresh child process and scratch directory, and
+prints the pages crawled and the peak RSS of each run. With the page
+pipeline the peak should stay flat as the number of pages grows.
+"""
+import argparse
+import tempfile
+
+from benchmarks.harness import DIR_LIST, in_child
+from benchmarks.mock_origin import FIXTURES_DIR, MockOrigin, start_in_thread
+from benchmarks.record import parse_range
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 3, 6, 12],
+                        help='numbers of locations to crawl, one run each')
+    parser.add_argument('--numbers', type=parse_range, default=parse_range('1-40'))
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--latency', type=float, default=5, help='mock origin delay per request, in ms')
+    parser.add_argument('--media-size', type=int, default=64 * 1024, help='synthetic media size in bytes')
+    args = parser.parse_args()
+
+    origin = MockOrigin(args.fixtures, args.latency, media_size=args.media_size)
+    base_url = start_in_thread(origin)
+
+    print(f"{'locations':>9} {'pages':>7} {'seconds':>8} {'peak RSS MiB':>13}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            result = in_child('crawl', workdir, base_url, DIR_LIST[:size], args.numbers)
+        print(f"{size:>9} {result['pages']:>7} {result['seconds']:>8.2f} {result['peak_rss_mib']:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
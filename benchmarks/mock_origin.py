@@ -0,0 +1,159 @@
+"""Local stand-in for the origin site, serving recorded or synthetic fixtures.
+
+Run from the repository root:
+
+    python -m benchmarks.mock_origin [--port 8080] [--latency 50] [--bandwidth 2048]
+
+Keyword result pages come from benchmarks/fixtures/manifest.json when it has
+been recorded (see benchmarks.record); otherwise every location gets a
+synthetic result page. Media bodies are generated on the fly at the recorded
+size, with Range support, so no video files need to be stored.
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+
+from aiohttp import web
+
+from benchmarks.parse_bench import synthetic_result_page
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+ORIGIN = "https://wu-massage.com"
+SYNTHETIC_POSTS = 40
+SYNTHETIC_MEDIA_SIZE = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def load_manifest(fixtures_dir=FIXTURES_DIR):
+    path = os.path.join(fixtures_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class MockOrigin:
+    """aiohttp application that replays fixtures with configurable latency (ms) and bandwidth (KiB/s)."""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR, latency=0, bandwidth=0,
+                 synthetic_posts=SYNTHETIC_POSTS, media_size=SYNTHETIC_MEDIA_SIZE):
+        self.fixtures_dir = fixtures_dir
+        self.manifest = load_manifest(fixtures_dir)
+        self.latency = latency / 1000.0
+        self.bandwidth = bandwidth * 1024
+        self.synthetic_posts = synthetic_posts
+        self.media_size = media_size
+        self.base_url = None
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def page_for(self, keyword):
+        if self.manifest is not None:
+            name = self.manifest['pages'].get(keyword)
+            if name is None:
+                return '<html><body></body></html>'
+            with open(os.path.join(self.fixtures_dir, name), encoding='utf-8') as f:
+                page_html = f.read()
+            # Recorded pages link media on the real origin; send those requests here instead
+            return page_html.replace(ORIGIN, self.base_url)
+        location = keyword.split('｜')[0]
+        return synthetic_result_page(location, self.synthetic_posts)
+
+    def media_for(self, path):
+        if self.manifest is not None:
+            return self.manifest['media'].get(path)
+        return {'length': self.media_size, 'content_type': 'video/mp4', 'accept_ranges': True}
+
+    async def send(self, request, response, body):
+        """Writes body to an already prepared response at the configured bandwidth."""
+        for start in range(0, len(body), CHUNK_SIZE):
+            chunk = body[start:start + CHUNK_SIZE]
+            await response.write(chunk)
+            self.bytes_sent += len(chunk)
+            if self.bandwidth:
+                await asyncio.sleep(len(chunk) / self.bandwidth)
+        await response.write_eof()
+        return response
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if request.path == '/' and 'keyword' in request.query:
+            body = self.page_for(request.query['keyword']).encode('utf-8')
+            response = web.StreamResponse(headers={'Content-Type': 'text/html; charset=utf-8'})
+            response.content_length = len(body)
+            await response.prepare(request)
+            return await self.send(request, response, body)
+
+        media = self.media_for(request.path)
+        if media is None:
+            raise web.HTTPNotFound()
+        length = media['length']
+        headers = {'Content-Type': media.get('content_type') or 'application/octet-stream'}
+        if media.get('accept_ranges'):
+            headers['Accept-Ranges'] = 'bytes'
+        start, end, status = 0, length - 1, 200
+        if media.get('accept_ranges') and request.http_range.start is not None:
+            start = request.http_range.start
+            end = (request.http_range.stop or length) - 1
+            if start >= length:
+                raise web.HTTPRequestRangeNotSatisfiable(headers={'Content-Range': f'bytes */{length}'})
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{length}'
+
+        response = web.StreamResponse(status=status, headers=headers)
+        response.content_length = end - start + 1
+        await response.prepare(request)
+        if request.method == 'HEAD':
+            return response
+        # Deterministic filler so resumed and ranged downloads can be checked byte for byte
+        pattern = bytes(range(256))
+        body = (pattern * (length // 256 + 1))[start:end + 1]
+        return await self.send(request, response, body)
+
+    def application(self):
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self.handle)
+        return app
+
+
+def start_in_thread(origin, host='127.0.0.1', port=0):
+    """Serves origin from a background thread; returns its base URL once it is listening."""
+    ready = threading.Event()
+
+    async def serve():
+        runner = web.AppRunner(origin.application())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        origin.base_url = f"http://{host}:{bound_port}"
+        ready.set()
+        await asyncio.Event().wait()
+
+    thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+    thread.start()
+    ready.wait()
+    return origin.base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    parser.add_argument('--latency', type=float, default=0, help='added delay per request, in ms')
+    parser.add_argument('--bandwidth', type=float, default=0, help='per-response limit in KiB/s, 0 for none')
+    args = parser.parse_args()
+
+    origin = MockOrigin(args.fixtures, args.latency, args.bandwidth)
+    origin.base_url = f"http://{args.host}:{args.port}"
+    web.run_app(origin.application(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
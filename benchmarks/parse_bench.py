@@ -0,0 +1,111 @@
+"""Parse-time and memory benchmark for crawl.py's result-page parsing.
+
+Run from the repository root:
+
+    python -m benchmarks.parse_bench [--fixtures DIR] [--repeat N]
+
+Every *.html file in the fixtures directory (pages recorded by
+benchmarks.record) is parsed with each available
+BeautifulSoup backend, once over the whole page and once scoped to the
+div.post containers. Without saved pages a synthetic result page is used.
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+import tracemalloc
+
+import crawl
+
+BACKENDS = ['html.parser', 'lxml']
+LOCATION = "西門定點"
+
+
+def synthetic_result_page(location=LOCATION, posts=40):
+    """A keyword result page shaped like the live site: chrome around a list of div.post blocks."""
+    chrome = ''.join(
+        f'<li class="menu-item"><a href="/category/{i}">分類 {i}</a></li>' for i in range(80)
+    )
+    script = '<script>' + 'var tracking = {"id": 1, "items": [1, 2, 3]};' * 200 + '</script>'
+    blocks = []
+    for number in range(1, posts + 1):
+        keyword = f"{location}｜免房費｜編號{number:02}區"
+        blocks.append(
+            f'<div class="post"><div class="meta"><span class="date">2024-01-{number % 28 + 1:02}</span></div>'
+            f'<span class="cnt more">{location} {number} 號<br>' + '介紹文字 ' * 40 +
+            f'<br><a href="/?keyword={keyword}">{keyword}</a></span>'
+            f'<div class="gallery">' + ''.join(
+                f'<img src="/upload/{number}-{i}.jpg" alt="">' for i in range(6)
+            ) + f'<video controls><source src="/upload/mp4/{location}-{number}.mp4"></video></div></div>'
+        )
+    return (
+        f'<html><head><title>{location}</title>{script}</head><body>'
+        f'<header><ul class="menu">{chrome}</ul></header><main>{"".join(blocks)}</main>'
+        f'<footer><ul>{chrome}</ul></footer></body></html>'
+    )
+
+
+def load_fixtures(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages.append((os.path.basename(path), f.read()))
+    return pages
+
+
+def available_backends():
+    backends = []
+    for backend in BACKENDS:
+        try:
+            crawl.BeautifulSoup('<p></p>', backend)
+        except Exception:
+            continue
+        backends.append(backend)
+    return backends
+
+
+def extract(page_html, backend, scoped):
+    """Same work as crawl.extract_posts, with an explicit backend and scope."""
+    page_soup = crawl.parse_result_page(page_html, backend, scoped)
+    spans = page_soup.find_all('span', class_='cnt more')
+    for index, span in enumerate(spans, 1):
+        crawl.build_post(span, index, span.find_all('a', href=True))
+    return len(spans)
+
+
+def measure(page_html, backend, scoped, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        spans = extract(page_html, backend, scoped)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    extract(page_html, backend, scoped)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak, spans
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', default=os.path.join(os.path.dirname(__file__), 'fixtures', 'pages'),
+                        help='directory of saved result pages (*.html)')
+    parser.add_argument('--repeat', type=int, default=20, help='parses per page and configuration')
+    args = parser.parse_args()
+
+    pages = load_fixtures(args.fixtures) or [('synthetic', synthetic_result_page())]
+    print(f"{'page':<24} {'backend':<12} {'scope':<6} {'spans':>5} {'ms/page':>9} {'peak KiB':>9}")
+    for name, page_html in pages:
+        baseline = None
+        for backend in available_backends():
+            for scoped in (False, True):
+                seconds, peak, spans = measure(page_html, backend, scoped, args.repeat)
+                baseline = baseline or (seconds, peak)
+                print(f"{name[:24]:<24} {backend:<12} {'posts' if scoped else 'page':<6} {spans:>5} "
+                      f"{seconds * 1000:>9.2f} {peak / 1024:>9.0f}"
+                      f"  ({baseline[0] / seconds:.1f}x time, {baseline[1] / peak:.1f}x memory)")
+
+
+if __name__ == '__main__':
+    main()
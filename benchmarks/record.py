@@ -0,0 +1,78 @@
+"""Records keyword result pages and media headers from the live site into fixtures.
+
+Run from the repository root:
+
+    python -m benchmarks.record [--locations 西門定點 中山定點] [--numbers 1-10]
+
+Pages are saved under benchmarks/fixtures/pages/ and indexed, together with
+the headers of every MP4 they link, in benchmarks/fixtures/manifest.json.
+Media bodies are not stored; benchmarks.mock_origin synthesizes them.
+"""
+import argparse
+import hashlib
+import json
+import os
+from urllib.parse import urlparse
+
+import requests
+
+import crawl
+from benchmarks.mock_origin import FIXTURES_DIR, ORIGIN
+
+
+def parse_range(text):
+    first, _, last = text.partition('-')
+    return range(int(first), int(last or first) + 1)
+
+
+def media_links(page_html):
+    """Every MP4 link on a result page, using the crawler's own filter."""
+    links = []
+    page_soup = crawl.parse_result_page(page_html)
+    for index, content_span in enumerate(page_soup.find_all('span', class_='cnt more'), 1):
+        links.extend(crawl.build_post(content_span, index, [])['media'])
+    return list(dict.fromkeys(links))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--locations', nargs='+', default=["西門定點"])
+    parser.add_argument('--numbers', type=parse_range, default=parse_range('1-10'))
+    parser.add_argument('--fixtures', default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    pages_dir = os.path.join(args.fixtures, 'pages')
+    os.makedirs(pages_dir, exist_ok=True)
+    manifest = {'pages': {}, 'media': {}}
+
+    with requests.Session() as session:
+        for location in args.locations:
+            for number in args.numbers:
+                for keyword in crawl.generate_keywords(location, number):
+                    response = session.get(f"{ORIGIN}?keyword={keyword}", timeout=30)
+                    response.raise_for_status()
+                    name = hashlib.sha256(response.content).hexdigest()[:16] + '.html'
+                    with open(os.path.join(pages_dir, name), 'w', encoding='utf-8') as f:
+                        f.write(response.text)
+                    manifest['pages'][keyword] = f'pages/{name}'
+                    print(f"Recorded {keyword} -> {name}")
+
+                    for link in media_links(response.text):
+                        url = crawl.normalize_media_url(link)
+                        path = urlparse(url).path
+                        if path in manifest['media']:
+                            continue
+                        head = session.head(url, allow_redirects=True, timeout=30)
+                        manifest['media'][path] = {
+                            'length': int(head.headers.get('Content-Length', 0)),
+                            'content_type': head.headers.get('Content-Type'),
+                            'accept_ranges': head.headers.get('Accept-Ranges') == 'bytes',
+                        }
+
+    with open(os.path.join(args.fixtures, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Recorded {len(manifest['pages'])} pages and {len(manifest['media'])} media headers")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Render-time benchmark for generate_html's post renderer.
+
+Run from the repository root:
+
+    python -m benchmarks.render_bench [--posts N] [--repeat N] [--baseline REV]
+
+Renders a synthetic location of --posts posts (1 to 8 media files each,
+half of them with sizes and thumbnails) with generate_post_html and
+reports the median time per 1,000 posts. With --baseline, the renderer
+from generate_html.py at that git revision is timed on the same posts
+and its output compared with the current one.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import time
+import types
+
+import generate_html
+
+LOCATION = "西門定點"
+
+
+def synthetic_posts(posts, location=LOCATION):
+    """(post_dir, content, media_files) per post, plus the media_meta for all of them."""
+    items = []
+    media_meta = {}
+    for number in range(1, posts + 1):
+        post_dir = str(number)
+        content = f"{location} {number} 號\n" + "介紹文字 " * 40 + "\n" + f"{location}｜免房費｜編號{number:02}區\n"
+        media_files = []
+        for i in range(number % 8 + 1):
+            name = f"{location}-{number}.mp4" if i == 0 else f"{number}-{i}.jpg"
+            path = os.path.join("html", location, post_dir, name)
+            media_files.append(path)
+            if number % 2:
+                meta = {"src": f"media/{number:064x}{os.path.splitext(name)[1]}", "size": [1080, 1350]}
+                if name.endswith(".jpg"):
+                    meta["srcset"] = [(f"thumbs/{number:02x}/{number:064x}-{width}.jpg", width) for width in (320, 640)]
+                else:
+                    meta["poster"] = f"thumbs/{number:02x}/{number:064x}-poster.jpg"
+                media_meta[path] = meta
+        items.append((post_dir, content, media_files))
+    return items, media_meta
+
+
+def baseline_module(revision):
+    """generate_html as it was at a git revision, loaded as a separate module."""
+    source = subprocess.run(
+        ["git", "show", f"{revision}:generate_html.py"],
+        cwd=os.path.dirname(os.path.abspath(generate_html.__file__)),
+        capture_output=True, text=True, check=True,
+    ).stdout
+    module = types.ModuleType(f"generate_html@{revision}")
+    module.__file__ = generate_html.__file__
+    exec(compile(source, module.__name__, "exec"), module.__dict__)
+    return module
+
+
+def render(module, items, media_meta):
+    return [
+        module.generate_post_html(post_dir, content, media_files, media_meta, lazy=index > 0)
+        for index, (post_dir, content, media_files) in enumerate(items)
+    ]
+
+
+def measure(module, items, media_meta, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render(module, items, media_meta)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--posts', type=int, default=1000, help='posts in the synthetic location')
+    parser.add_argument('--repeat', type=int, default=20, help='renders per renderer')
+    parser.add_argument('--baseline', help='git revision whose renderer is timed for comparison')
+    args = parser.parse_args()
+
+    items, media_meta = synthetic_posts(args.posts)
+    renderers = [('current', generate_html)]
+    if args.baseline:
+        renderers.insert(0, (args.baseline, baseline_module(args.baseline)))
+
+    print(f"{'renderer':<16} {'posts':>6} {'ms/1000 posts':>14}")
+    results = {}
+    for name, module in renderers:
+        seconds = measure(module, items, media_meta, args.repeat)
+        results[name] = seconds
+        print(f"{name[:16]:<16} {args.posts:>6} {seconds * 1000 * 1000 / args.posts:>14.2f}"
+              + (f"  ({results[renderers[0][0]] / seconds:.2f}x)" if len(results) > 1 else ""))
+    if args.baseline:
+        same = render(renderers[0][1], items, media_meta) == render(generate_html, items, media_meta)
+        print(f"Output {'matches' if same else 'differs from'} {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+
+from sqlite_store import open_sqlite
+
+CATALOG_PATH = os.path.join('html', 'catalog.sqlite')
+
+class PostCatalog:
+    """SQLite catalog of crawled posts: content, links and media URLs per (location, number).
+
+    Rows are clustered by (location, number), so one location's posts are a
+    single sequential range read.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.connection = open_sqlite(path)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS posts (
+                location TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                links TEXT NOT NULL,
+                media TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (location, number)
+            ) WITHOUT ROWID"""
+        )
+        self.connection.commit()
+
+    def content_hash(self, location, number):
+        """The stored hash of a post, or None if it is not in the catalog."""
+        row = self.connection.execute(
+            'SELECT content_hash FROM posts WHERE location = ? AND number = ?', (location, number)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, location, number):
+        """One post as a dict with content, links, media and content_hash, or None."""
+        row = self.connection.execute(
+            'SELECT number, content, links, media, content_hash FROM posts WHERE location = ? AND number = ?',
+            (location, number)
+        ).fetchone()
+        return post_from_row(row)[1] if row else None
+
+    def location(self, location):
+        """Every post of location in post number order, keyed by its directory name."""
+        rows = self.connection.execute(
+            'SELECT number, content, links, media, content_hash FROM posts WHERE location = ? ORDER BY number',
+            (location,)
+        ).fetchall()
+        return dict(post_from_row(row) for row in rows)
+
+    def put(self, location, number, post, content_hash):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (location, number, post['content'], json.dumps(post['links'], ensure_ascii=False),
+             json.dumps(post['media'], ensure_ascii=False), content_hash, time.time())
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def post_from_row(row):
+    number, content, links, media, content_hash = row
+    return str(number), {
+        'content': content, 'links': json.loads(links), 'media': json.loads(media), 'content_hash': content_hash,
+    }
+
+def read_location(location, path=CATALOG_PATH):
+    """The posts of location from the catalog at path, without creating it; {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    catalog = PostCatalog(path)
+    try:
+        return catalog.location(location)
+    finally:
+        catalog.close()
@@ -1,10 +1,91 @@
 import os
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import urljoin, urlparse, unquote
 import multiprocessing
 import concurrent.futures
 import re
+import argparse
+import asyncio
+import contextlib
+import collections
+import time
+import hashlib
+import json
+import sqlite3
+import random
+import shutil
+import email.utils
+import aiohttp
+from metrics import Metrics
+from sqlite_store import open_sqlite
+from catalog import CATALOG_PATH, PostCatalog
+from response_cache import CACHE_PATH, CACHE_TTL, CACHE_MAX_BYTES, CacheMiss, ResponseCache
+
+try:
+    import lxml  # noqa: F401  (only needed as a BeautifulSoup tree builder)
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+# BeautifulSoup tree builder for result pages; the environment variable reaches pool workers too
+HTML_PARSER = os.environ.get('CRAWL_HTML_PARSER', DEFAULT_PARSER)
+def post_or_content_class(value):
+    """True for a class attribute naming a post container or a content span.
+
+    The strainer may pass the whole attribute string or a single class, depending on the bs4 version.
+    """
+    classes = set((value or '').split())
+    return 'post' in classes or {'cnt', 'more'} <= classes
+
+# Only the post containers, and content spans outside them, are needed from a result page
+POST_STRAINER = SoupStrainer(['div', 'span'], class_=post_or_content_class)
+
+# Origin that relative media links resolve against
+MEDIA_BASE_URL = "https://wu-massage.com"
+
+# Politeness defaults for the asyncio engine
+MAX_PER_HOST = 8
+REQUESTS_PER_SECOND = 10.0
+# Adaptive concurrency per host: start low, add a slot after a window of fast successes,
+# halve on 429/5xx or timeouts; responses slower than LATENCY_FACTOR x the best seen never widen it
+INITIAL_PER_HOST = 2
+MIN_PER_HOST = 1
+LATENCY_FACTOR = 3.0
+# Longest Retry-After honoured, in seconds
+MAX_RETRY_AFTER = 300
+# Result pages: request timeout in seconds, and how often a throttled or timed-out page is re-queued
+PAGE_TIMEOUT = 30
+PAGE_RETRIES = 4
+PAGE_BACKOFF = 1.0
+# Concurrent page workers for the asyncio engine
+ASYNC_WORKERS = 32
+# Persistent record of previous crawls, used for conditional requests
+CRAWL_INDEX_PATH = os.path.join('html', 'crawl_index.sqlite')
+# Per-stage timings and counters, exported as JSON lines by the asyncio engine
+METRICS_PATH = os.path.join('html', 'crawl_metrics.jsonl')
+metrics = Metrics()
+# Media downloads: timeouts, retries and when to split a file into parallel ranges
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=15, sock_read=60)
+DOWNLOAD_RETRIES = 4
+DOWNLOAD_BACKOFF = 1.0
+RANGE_THRESHOLD = 16 * 1024 * 1024
+RANGE_PARTS = 4
+MIN_BUFFER = 64 * 1024
+MAX_BUFFER = 4 * 1024 * 1024
+# Shared media queue for the asyncio engine; page workers wait once the backlog is full
+DOWNLOAD_WORKERS = 8
+MEDIA_QUEUE_SIZE = 256
+# Page pipeline of the asyncio engine: fetched pages waiting for a parser, and parsed posts waiting to be saved
+PARSE_WORKERS = 2
+PARSE_QUEUE_SIZE = 8
+PERSIST_QUEUE_SIZE = 32
+# Listing discovery: one location-wide search, paged, instead of one search per number
+LISTING_PAGE_PARAM = 'page'
+MAX_LISTING_PAGES = 50
+# Every downloaded file is stored once here as <sha256><ext> and hard-linked into the posts using it
+MEDIA_STORE = os.path.join('html', 'media')
+MEDIA_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.mp4', '.webm')
 
 def create_directory(base_dir, sub_dir):
     sub_dir = str(sub_dir)
@@ -12,31 +93,311 @@ def create_directory(base_dir, sub_dir):
     os.makedirs(path, exist_ok=True)
     return path
 
-def download_media(url, directory):
+def normalize_media_url(url):
+    # Remove any fragment identifier (like #t=1)
+    url = url.split('#')[0]
+    
+    # Ensure the URL is complete
+    if not url.startswith(('http://', 'https://')):
+        url = f"{MEDIA_BASE_URL}/{url.lstrip('/')}"
+    return url
+
+def media_filename(url):
+    # Extract filename, preserving the original extension
+    return os.path.basename(urlparse(url).path)
+
+def media_names(urls):
+    """Pairs each media URL of a post with its file name in the post directory.
+
+    Names are the URL basenames; when two URLs share one, the later ones get
+    a short hash of their URL so they do not overwrite each other.
+    """
+    names = []
+    used = set()
+    for url in urls:
+        name = media_filename(normalize_media_url(url))
+        if name in used:
+            stem, ext = os.path.splitext(name)
+            name = f"{stem}-{hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]}{ext}"
+        used.add(name)
+        names.append((url, name))
+    return names
+
+def media_path(url, directory, name=None):
+    return os.path.join(directory, name or media_filename(url))
+
+def media_exists(file_path):
+    return os.path.exists(file_path) and os.path.getsize(file_path) > 0
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(MAX_BUFFER), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_media(path):
+    """Moves a complete download into MEDIA_STORE, keyed by its content; returns the stored path.
+
+    If the store already holds the same bytes, path is dropped instead.
+    """
+    stored = os.path.join(MEDIA_STORE, file_sha256(path) + os.path.splitext(path.removesuffix('.part'))[1].lower())
+    os.makedirs(MEDIA_STORE, exist_ok=True)
+    if media_exists(stored):
+        os.remove(path)
+        metrics.count('media_deduplicated')
+    else:
+        os.replace(path, stored)
+    return stored
+
+def link_media(source, target, reused=True):
+    """Makes a stored file available at target, by hard link where possible.
+
+    reused=False marks the link of a file that was just downloaded or adopted,
+    which is not reported as a reuse.
+    """
+    if media_exists(target) and os.path.samefile(source, target):
+        return target
+    # Link under a temporary name so an existing target is swapped in one step
+    temp = target + '.link'
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(temp)
     try:
-        # Remove any fragment identifier (like #t=1)
-        url = url.split('#')[0]
-        
-        # Ensure the URL is complete
-        if not url.startswith(('http://', 'https://')):
-            url = f"https://wu-massage.com/{url.lstrip('/')}"
-        
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        # Extract filename, preserving the original extension
-        filename = os.path.basename(urlparse(url).path)
-        file_path = os.path.join(directory, filename)
-        
-        with open(file_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        print(f"Downloaded media: {file_path}")
-    except Exception as e:
-        print(f"Failed to download media {url}: {e}")
+        os.link(source, temp)
+    except OSError:
+        shutil.copy2(source, temp)
+    os.replace(temp, target)
+    if reused:
+        metrics.count('media_linked')
+        print(f"Linked media: {target}")
+    return target
+
+def adopt_media(download_directory):
+    """Moves media downloaded before the store existed into it, leaving hard links behind."""
+    adopted = 0
+    for post_dir in sorted(os.listdir(download_directory)):
+        post_path = os.path.join(download_directory, post_dir)
+        if not os.path.isdir(post_path):
+            continue
+        for name in sorted(os.listdir(post_path)):
+            path = os.path.join(post_path, name)
+            if not name.lower().endswith(MEDIA_EXTENSIONS) or not media_exists(path):
+                continue
+            if os.stat(path).st_nlink > 1:
+                continue  # Already linked to the store
+            # Work on a second link so the post keeps its file until the store link replaces it
+            os.link(path, path + '.part')
+            link_media(store_media(path + '.part'), path, reused=False)
+            adopted += 1
+    return adopted
+
+def read_links_file(path):
+    """(href, text) pairs from a links.txt written by earlier crawls."""
+    links = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for block in f.read().split('\n\n'):
+            lines = block.split('\n')
+            if len(lines) == 2 and lines[0].startswith('Link: ') and lines[1].startswith('Text: '):
+                links.append([lines[0][len('Link: '):], lines[1][len('Text: '):]])
+    return links
+
+def import_posts(download_directory, catalog, index=None):
+    """Moves content.txt and links.txt from earlier crawls into the catalog, then removes them.
+
+    Media URLs come from the crawl index, when it predates the catalog and
+    still lists them.
+    """
+    location = location_name(download_directory)
+    imported = 0
+    for post_dir in sorted(os.listdir(download_directory)):
+        content_file = os.path.join(download_directory, post_dir, 'content.txt')
+        if not post_dir.isdigit() or not os.path.isfile(content_file):
+            continue
+        links_file = os.path.join(download_directory, post_dir, 'links.txt')
+        with open(content_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        entry = index.get(location, int(post_dir)) if index is not None else None
+        post = {
+            'content': content,
+            'links': read_links_file(links_file) if os.path.exists(links_file) else [],
+            'media': entry.get('media', []) if entry else [],
+        }
+        catalog.put(location, int(post_dir), post, post_hash(post))
+        os.remove(content_file)
+        if os.path.exists(links_file):
+            os.remove(links_file)
+        imported += 1
+    return imported
+
+class Throttled(Exception):
+    """A 429 or 5xx response; retry_after is the server's requested delay in seconds, if any."""
+
+    def __init__(self, url, status, retry_after=None):
+        super().__init__(f"{status} from {url}" + (f", retry after {retry_after:.0f}s" if retry_after else ""))
+        self.status = status
+        self.retry_after = retry_after
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date; None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+def check_throttling(url, status, headers):
+    """Raises Throttled if the server is overloaded or rate-limiting us."""
+    if status == 429 or status >= 500:
+        metrics.count('throttled')
+        raise Throttled(url, status, retry_after_seconds(headers.get('Retry-After')))
+
+def retry_delay(attempt, error=None, base=PAGE_BACKOFF):
+    """Exponential backoff from base with jitter for attempt, or the server's Retry-After when it asks for longer."""
+    delay = base * 2 ** attempt + random.uniform(0, base)
+    if isinstance(error, Throttled) and error.retry_after:
+        delay = max(delay, min(error.retry_after, MAX_RETRY_AFTER))
+    return delay
+
+def download_media(url, directory, name=None):
+    """Blocking wrapper around async_download_media for the process-pool engine."""
+    async def run():
+        async with create_session() as session:
+            await async_download_media(session, HostLimiter(), url, directory, name)
+    asyncio.run(run())
+
+class CrawlIndex:
+    """SQLite record of the URL and validators that last fetched each (location, number).
+
+    Post contents, hashes and media live in the catalog. Indexes written
+    before it existed also carry content_hash and media columns; they are
+    no longer written, and only import_posts reads the media from them.
+    """
+
+    def __init__(self, path=CRAWL_INDEX_PATH):
+        self.connection = open_sqlite(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS pages (
+                location TEXT NOT NULL,
+                number INTEGER NOT NULL,
+                url TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                PRIMARY KEY (location, number)
+            )"""
+        )
+        self.connection.commit()
+
+    def get(self, location, number):
+        row = self.connection.execute(
+            'SELECT * FROM pages WHERE location = ? AND number = ?', (location, number)
+        ).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        if 'media' in entry:
+            entry['media'] = json.loads(entry['media'] or '[]')
+        return entry
+
+    def put(self, location, number, url, etag, last_modified):
+        # Named columns, so older indexes with the extra columns take the same statement
+        self.connection.execute(
+            'INSERT OR REPLACE INTO pages (location, number, url, etag, last_modified, fetched_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (location, number, url, etag, last_modified, time.time())
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+_worker_stores = {}
+
+def worker_store(store_class, path, *args):
+    """Returns this process's store_class(path, *args), such as its CrawlIndex, or None without a path.
+
+    Each pool worker opens a store once and reuses the connection for every page.
+    """
+    if path is None:
+        return None
+    if (store_class, path) not in _worker_stores:
+        _worker_stores[(store_class, path)] = store_class(path, *args)
+    return _worker_stores[(store_class, path)]
+
+def cached_page(cache, page_url, offline=False):
+    """(page_html, validators) from the response cache, or None when the page has to be fetched.
+
+    Offline, the TTL is ignored and a miss raises CacheMiss instead.
+    """
+    hit = cache.get(page_url, ignore_ttl=offline) if cache is not None else None
+    if hit is not None:
+        metrics.count('cache_hits')
+        return hit['body'], (hit['etag'], hit['last_modified'])
+    if cache is not None:
+        metrics.count('cache_misses')
+    if offline:
+        raise CacheMiss(f"not in the response cache: {page_url}")
+    return None
+
+def post_hash(post):
+    payload = json.dumps([post['content'], post['links'], post['media']], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def conditional_headers(entry, page_url, catalog):
+    """Validators from the last crawl, when it fetched the same URL and its post is in the catalog.
+
+    A 304 saves nothing, so a post missing from the catalog is always fetched in full.
+    """
+    headers = {}
+    if entry and entry['url'] == page_url and catalog.content_hash(entry['location'], entry['number']) is not None:
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+def ordered_keywords(download_directory, number, base_url, entry):
+    """Keyword variants, starting with the one that matched on the last crawl."""
+    keywords = generate_keywords(download_directory, number)
+    if entry:
+        keywords.sort(key=lambda keyword: f"{base_url}?keyword={keyword}" != entry['url'])
+    return keywords
+
+def location_name(download_directory):
+    return download_directory.split('/')[-1]
+
+def post_tags(directory):
+    """Metric tags for a post directory such as html/<location>/<number>."""
+    parent, number = os.path.split(os.path.normpath(directory))
+    if not number.isdigit():
+        return {}
+    return {'location': location_name(parent), 'number': int(number)}
+
+def save_post(download_directory, number, post, catalog):
+    """Records the post in the catalog unless it is unchanged there; returns the post directory.
+
+    The post directory is still created: it holds the post's media links.
+    """
+    sub_dir = create_directory(download_directory, f"{number}")
+    content_hash = post_hash(post)
+    location = location_name(download_directory)
+    if catalog.content_hash(location, number) == content_hash:
+        metrics.count('posts_unchanged')
+        print(f"Unchanged post {number}, keeping the catalog entry")
+    else:
+        with metrics.timer('write'):
+            catalog.put(location, number, post, content_hash)
+    return sub_dir
 
 def generate_keywords(download_directory, number):
-    location = download_directory.split('/')[-1]  # Extract the location name
+    location = location_name(download_directory)  # Extract the location name
     return [
         f"{location}｜免房費｜編號{number:02}區",
         f"{location}｜免房費｜編號#{number:02}區"
@@ -58,102 +419,948 @@ def clean_content(targeted_content):
     return cleaned_content
 
 
-def scrape_page(base_url, number, download_directory):
-    keywords = generate_keywords(download_directory, number)
+def parse_result_page(page_html, parser=None, scoped=True):
+    """Parses a result page; when scoped, keeps only div.post containers and span.cnt.more elements.
+
+    One pass also covers pages without any div.post: their stray spans are
+    kept, and media is only read from a span's enclosing div.post, which
+    the strainer keeps whole.
+    """
+    parser = parser or HTML_PARSER
+    if scoped:
+        return BeautifulSoup(page_html, parser, parse_only=POST_STRAINER)
+    return BeautifulSoup(page_html, parser)
+
+def build_post(content_span, content_span_index, matching_links):
+    """Turns a matched span.cnt.more into a dict with the cleaned content, the
+    matching (href, text) links and the MP4 links found in the enclosing post."""
+    # Replace <br> tags with newline characters
+    #for br in content_span.find_all('br'):
+    #    br.replace_with('\n')
+    
+    # Get text content, preserving line breaks
+    targeted_content = content_span.get_text(strip=False)
+    
+    mp4_links = []
+    post_div = content_span.find_parent('div', class_='post')
+    if post_div:
+        # Look for source tags with mp4 files
+        source_tags = post_div.find_all('source', src=True)
+        
+        # Also look for video and img tags with mp4 links
+        video_tags = post_div.find_all('video', src=True)
+        img_tags = post_div.find_all('img', src=True)
+        
+        # Combine media
+        all_media = (
+            [tag['src'] for tag in source_tags] +
+            [tag['src'] for tag in video_tags] +
+            [tag['src'] for tag in img_tags]
+        )
+        
+        # Filter for MP4 files
+        mp4_links = [
+            link for link in all_media 
+            if link.lower().endswith('.mp4') or 
+               '/mp4/' in link.lower() or 
+               'CKEdit/images/file' in link
+        ]
+
+    return {
+        'index': content_span_index,
+        # Remove consecutive empty lines
+        'content': clean_content(targeted_content),
+        'links': [(link['href'], link.get_text(strip=True)) for link in matching_links],
+        # Unique MP4 links, in page order
+        'media': list(dict.fromkeys(mp4_links)),
+    }
+
+def extract_post(page_html, target_keyword):
+    """Finds the first post on a keyword result page that links to target_keyword.
+
+    Returns the build_post dict, or None when nothing matches.
+    """
+    page_soup = parse_result_page(page_html)
+    try:
+        content_spans = page_soup.find_all('span', class_='cnt more')
+
+        for content_span_index, content_span in enumerate(content_spans, 1):
+            links = content_span.find_all('a', href=True)
+            
+            matching_links = [
+                link for link in links 
+                if target_keyword in link.get('href', '') or target_keyword in link.get_text(strip=True) or
+                target_keyword.rstrip('區') in link.get('href', '')
+            ]
+
+            if matching_links:
+                return build_post(content_span, content_span_index, matching_links)
+        return None
+    finally:
+        # The tree is full of parent/child reference cycles; free it now rather than at the next GC
+        page_soup.decompose()
+
+def post_number_pattern(location):
+    """Matches the keyword of any post number for location, with or without the '#'."""
+    return re.compile(rf"{re.escape(location)}｜免房費｜編號#?(\d+)")
+
+def extract_posts(page_html, location):
+    """Finds every post on a listing page and keys it by the post number its links name.
+
+    Like extract_post, the first span that mentions a number wins.
+    """
+    page_soup = parse_result_page(page_html)
+    pattern = post_number_pattern(location)
+    posts = {}
+
+    for content_span_index, content_span in enumerate(page_soup.find_all('span', class_='cnt more'), 1):
+        links_by_number = {}
+        for link in content_span.find_all('a', href=True):
+            match = pattern.search(unquote(link['href'])) or pattern.search(link.get_text(strip=True))
+            if match:
+                links_by_number.setdefault(int(match.group(1)), []).append(link)
+
+        for number, matching_links in links_by_number.items():
+            if number not in posts:
+                posts[number] = build_post(content_span, content_span_index, matching_links)
+    page_soup.decompose()
+    return posts
+
+def fetch_page(page_url, headers):
+    """GETs a result page, retrying timeouts, dropped connections and 429/5xx with backoff."""
+    for attempt in range(PAGE_RETRIES + 1):
+        try:
+            with metrics.timer('fetch'):
+                response = requests.get(page_url, headers=headers, timeout=PAGE_TIMEOUT)
+            check_throttling(page_url, response.status_code, response.headers)
+            response.raise_for_status()
+            return response
+        except (Throttled, requests.Timeout, requests.ConnectionError) as e:
+            if attempt == PAGE_RETRIES:
+                raise
+            delay = retry_delay(attempt, e)
+            metrics.count('page_retries')
+            print(f"Retrying {page_url} in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+def scrape_page(base_url, number, download_directory, index_path=None, full=False, cache_settings=None,
+                catalog_path=CATALOG_PATH):
+    index = worker_store(CrawlIndex, index_path)
+    catalog = worker_store(PostCatalog, catalog_path)
+    cache = None
+    if cache_settings is not None:
+        cache = worker_store(ResponseCache, cache_settings['path'], cache_settings['ttl'], cache_settings['max_bytes'])
+    offline = bool(cache_settings and cache_settings['offline'])
+    location = location_name(download_directory)
+    entry = None if index is None or full else index.get(location, number)
+    keywords = ordered_keywords(download_directory, number, base_url, entry)
     
     for target_keyword in keywords:
         page_url = f"{base_url}?keyword={target_keyword}"
         print(f"Scraping {page_url}...")
         
         try:
-            response = requests.get(page_url)
-            response.raise_for_status()
-            page_soup = BeautifulSoup(response.text, "html.parser")
+            cached = cached_page(cache, page_url, offline)
+            if cached:
+                page_html, validators = cached
+            else:
+                response = fetch_page(page_url, conditional_headers(entry, page_url, catalog))
+                metrics.count('pages_fetched')
 
-            content_spans = page_soup.find_all('span', class_='cnt more')
+                if response.status_code == 304:
+                    metrics.count('pages_not_modified')
+                    # Only fetch media that is missing on disk
+                    sub_dir = create_directory(download_directory, f"{number}")
+                    for mp4_link, name in media_names(catalog.get(location, number)['media']):
+                        download_media(mp4_link, sub_dir, name)
+                    print(f"Not modified: page {number}")
+                    return
 
-            for content_span_index, content_span in enumerate(content_spans, 1):
-                links = content_span.find_all('a', href=True)
-                
-                matching_links = [
-                    link for link in links 
-                    if target_keyword in link.get('href', '') or target_keyword in link.get_text(strip=True) or
-                    target_keyword.rstrip('區') in link.get('href', '')
-                ]
+                page_html = response.text
+                validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                response = None
+                if cache is not None:
+                    cache.put(page_url, page_html, *validators)
 
-                if matching_links:
-                    sub_dir = create_directory(download_directory, f"{number}")
+            with metrics.timer('parse'):
+                post = extract_post(page_html, target_keyword)
+            # Drop the page body before writing files and downloading media
+            page_html = None
 
-                    # Replace <br> tags with newline characters
-                    #for br in content_span.find_all('br'):
-                    #    br.replace_with('\n')
-                    
-                    # Get text content, preserving line breaks
-                    targeted_content = content_span.get_text(strip=False)
-                    
-                    # Remove consecutive empty lines
-                    cleaned_content = clean_content(targeted_content)
-                    
-                    with open(os.path.join(sub_dir, 'content.txt'), 'w', encoding='utf-8') as f:
-                        f.write(cleaned_content)
-                    
-                    with open(os.path.join(sub_dir, 'links.txt'), 'w', encoding='utf-8') as f:
-                        for link in matching_links:
-                            href = link['href']
-                            link_text = link.get_text(strip=True)
-                            f.write(f"Link: {href}\nText: {link_text}\n\n")
-                    
-                    post_div = content_span.find_parent('div', class_='post')
-                    if post_div:
-                        # Look for source tags with mp4 files
-                        source_tags = post_div.find_all('source', src=True)
-                        
-                        # Also look for video and img tags with mp4 links
-                        video_tags = post_div.find_all('video', src=True)
-                        img_tags = post_div.find_all('img', src=True)
-                        
-                        # Combine and download media
-                        all_media = (
-                            [tag['src'] for tag in source_tags] +
-                            [tag['src'] for tag in video_tags] +
-                            [tag['src'] for tag in img_tags]
-                        )
-                        
-                        # Filter for MP4 files
-                        mp4_links = [
-                            link for link in all_media 
-                            if link.lower().endswith('.mp4') or 
-                               '/mp4/' in link.lower() or 
-                               'CKEdit/images/file' in link
-                        ]
-                        
-                        # Download unique MP4 links
-                        for mp4_link in set(mp4_links):
-                            download_media(mp4_link, sub_dir)
-                    
-                    print(f"Processed content span {content_span_index} for page {number}")
-                    return  # Exit after first match
+            if post:
+                metrics.count('posts_found')
+                sub_dir = save_post(download_directory, number, post, catalog)
+                
+                # Download unique MP4 links; offline runs only replay pages
+                for mp4_link, name in media_names(post['media']) if not offline else []:
+                    download_media(mp4_link, sub_dir, name)
+                
+                if index is not None:
+                    index.put(location, number, page_url, *validators)
+                print(f"Processed content span {post['index']} for page {number}")
+                return  # Exit after first match
 
         except Exception as e:
+            metrics.count('page_errors')
             print(f"Failed to scrape page {number} with keyword {target_keyword}: {e}")
+    metrics.count('posts_missing')
+
+def measured_scrape_page(*args):
+    """Runs scrape_page in a pool worker and returns the metrics it recorded, for the parent to merge."""
+    # Also drops the metrics file a forked worker inherits, so only the parent writes to it
+    metrics.start()
+    scrape_page(*args)
+    return metrics.snapshot()
+
+def build_work_list(dir_list, start_number, end_number):
+    """Returns every (html_directory, number) pair to crawl, creating the location directories."""
+    work = []
+    for download_directory in dir_list:
+        # Create the 'html' directory if it doesn't exist
+        html_directory = os.path.join('html', download_directory)
+        os.makedirs(html_directory, exist_ok=True)
+        work.extend((html_directory, number) for number in range(start_number, end_number + 1))
+    return work
+
+class LocationProgress:
+    """Tracks outstanding pages per location and reports each location as it completes."""
+
+    def __init__(self, work):
+        self.total = collections.Counter(html_directory for html_directory, _ in work)
+        self.remaining = collections.Counter(self.total)
+        self.started = time.monotonic()
+
+    def done(self, html_directory, count=1):
+        self.remaining[html_directory] -= count
+        if self.remaining[html_directory] == 0:
+            elapsed = time.monotonic() - self.started
+            finished = sum(1 for count in self.remaining.values() if count == 0)
+            print(f"Finished {html_directory}: {self.total[html_directory]} pages after {elapsed:.1f}s "
+                  f"({finished}/{len(self.total)} locations)")
+
+def crawl_all(base_url, dir_list, start_number, end_number, max_workers=None,
+              index_path=CRAWL_INDEX_PATH, full=False, cache_settings=None, catalog_path=CATALOG_PATH,
+              metrics_path=METRICS_PATH):
+    """Scrapes every location through a single process pool.
+
+    Each worker returns the counters and timings of its page, and the parent
+    merges them into the end-of-run summary; the per-event lines of the
+    metrics file are only written by the async engine.
+    """
+    work = build_work_list(dir_list, start_number, end_number)
+    progress = LocationProgress(work)
+
+    metrics.start(metrics_path)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        # Submit all scraping tasks at once so workers never idle between locations
+        futures = {
+            executor.submit(measured_scrape_page, base_url, number, html_directory, index_path, full, cache_settings,
+                            catalog_path): html_directory
+            for html_directory, number in work
+        }
+        
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception() is None:
+                metrics.merge(future.result())
+            progress.done(futures[future])
+    metrics.summary()
+    metrics.close()
 
 def main(base_url, download_directory, start_number, end_number):
-    # Create the 'html' directory if it doesn't exist
-    html_directory = os.path.join('html', download_directory)
-    os.makedirs(html_directory, exist_ok=True)
-
-    # Use ProcessPoolExecutor for CPU-bound tasks
-    with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
-        # Submit all scraping tasks
-        futures = [
-            executor.submit(scrape_page, base_url, number, html_directory) 
-            for number in range(start_number, end_number + 1)
-        ]
+    crawl_all(base_url, [download_directory], start_number, end_number)
+
+class HostState:
+    """Adaptive limit, in-flight count and backoff bookkeeping for one kind of request to one host."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.condition = asyncio.Condition()
+        self.backed_off_at = 0.0
+        self.successes = 0
+        self.best_latency = None
+
+class HostLimiter:
+    """Adapts the number of in-flight requests per host, and caps their rate.
+
+    Pages and media get separate limits per host, so long media transfers
+    neither hold page slots nor hold back page concurrency. Each starts at
+    initial_per_host concurrent requests. After a full window of successes
+    (as many as the current limit) whose response headers all arrived
+    within LATENCY_FACTOR times the fastest seen, the limit grows by one,
+    up to max_per_host. A Throttled response or a timeout inside a slot
+    halves it, once per burst of failures, and a Retry-After pauses every
+    request to the host until it has passed. The rate cap is per host.
+    """
+
+    def __init__(self, max_per_host=MAX_PER_HOST, requests_per_second=REQUESTS_PER_SECOND,
+                 initial_per_host=INITIAL_PER_HOST):
+        self.max_per_host = max_per_host
+        self.initial_per_host = min(initial_per_host, max_per_host)
+        self.requests_per_second = requests_per_second
+        self._states = {}        # (host, kind) -> HostState
+        self._next_slot = {}     # host -> earliest start of its next request
+        self._paused_until = {}  # host -> end of its Retry-After pause
+
+    def limit(self, url, kind='page'):
+        """The current concurrency limit for kind requests to url's host."""
+        state = self._states.get((urlparse(url).netloc, kind))
+        return state.limit if state else self.initial_per_host
+
+    async def _wait_turn(self, host):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._paused_until.get(host, now))
+        if self.requests_per_second and self.requests_per_second > 0:
+            slot = max(slot, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + 1.0 / self.requests_per_second
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _succeeded(self, host, kind, state, latency):
+        if state.best_latency is None or latency < state.best_latency:
+            state.best_latency = latency
+        if latency > LATENCY_FACTOR * state.best_latency:
+            state.successes = 0
+            return
+        state.successes += 1
+        if state.successes >= state.limit and state.limit < self.max_per_host:
+            state.limit += 1
+            state.successes = 0
+            print(f"Raising {kind} concurrency for {host} to {state.limit}")
+
+    def _back_off(self, host, kind, state, started, retry_after=None):
+        now = asyncio.get_running_loop().time()
+        if retry_after:
+            self._paused_until[host] = max(self._paused_until.get(host, now), now + min(retry_after, MAX_RETRY_AFTER))
+        state.successes = 0
+        # Requests already in flight when the limit dropped fail for the same reason; count the burst once
+        if started < state.backed_off_at:
+            return
+        state.backed_off_at = now
+        metrics.count('backoffs')
+        if state.limit > MIN_PER_HOST:
+            state.limit = max(MIN_PER_HOST, state.limit // 2)
+        print(f"Backing off {host} to {state.limit} concurrent {kind} requests"
+              + (f", paused for {retry_after:.0f}s" if retry_after else ""))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url, kind='page'):
+        """Holds one of the host's kind slots; yields a function to call once the response headers are in.
+
+        The latency that decides growth runs up to that call, so a long body
+        transfer does not count as a slow response.
+        """
+        host = urlparse(url).netloc
+        state = self._states.get((host, kind))
+        if state is None:
+            state = self._states[(host, kind)] = HostState(self.initial_per_host)
+        async with state.condition:
+            await state.condition.wait_for(lambda: state.active < state.limit)
+            state.active += 1
+        try:
+            await self._wait_turn(host)
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            responded = []
+            try:
+                yield lambda: responded.append(loop.time())
+            except Throttled as e:
+                self._back_off(host, kind, state, started, e.retry_after)
+                raise
+            except asyncio.TimeoutError:
+                self._back_off(host, kind, state, started)
+                raise
+            self._succeeded(host, kind, state, (responded[0] if responded else loop.time()) - started)
+        finally:
+            state.active -= 1
+            async with state.condition:
+                state.condition.notify_all()
+
+def create_session(max_per_host=MAX_PER_HOST):
+    """Creates the pooled aiohttp session shared by every location and page."""
+    # Pages and media each have up to max_per_host requests in flight
+    connector = aiohttp.TCPConnector(limit_per_host=2 * max_per_host, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=PAGE_TIMEOUT),
+                                 trace_configs=[metrics.trace_config()])
+
+async def stream_to_file(response, f):
+    """Copies a response body into f, growing the read size while reads come back full and fast."""
+    buffer_size = MIN_BUFFER
+    while True:
+        started = time.monotonic()
+        chunk = await response.content.read(buffer_size)
+        if not chunk:
+            break
+        f.write(chunk)
+        elapsed = time.monotonic() - started
+        if len(chunk) == buffer_size and elapsed < 0.05:
+            buffer_size = min(buffer_size * 2, MAX_BUFFER)
+        elif elapsed > 0.5:
+            buffer_size = max(buffer_size // 2, MIN_BUFFER)
+
+class MediaChanged(Exception):
+    """The origin's file no longer matches the partial data of a download."""
+
+def response_validator(headers):
+    """The If-Range value for a response: its strong ETag, else its Last-Modified, else None."""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+def read_validator(part_path):
+    """The validator of the version whose bytes part_path (or its segments) hold, or None."""
+    try:
+        with open(part_path + '.validator', 'r', encoding='utf-8') as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+
+def write_validator(part_path, validator):
+    if validator:
+        with open(part_path + '.validator', 'w', encoding='utf-8') as f:
+            f.write(validator)
+    elif os.path.exists(part_path + '.validator'):
+        os.remove(part_path + '.validator')
+
+def discard_partial(part_path):
+    """Removes a download's partial data, its segments and its validator."""
+    for path in [part_path, part_path + '.validator'] + [f"{part_path}{i}" for i in range(RANGE_PARTS)]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def range_total(response):
+    """The complete length from a Content-Range header such as 'bytes */1234', or None."""
+    _, _, total = response.headers.get('Content-Range', '').rpartition('/')
+    return int(total) if total.isdigit() else None
+
+async def fetch_range(session, limiter, url, path, start=0, end=None, validator=None):
+    """Streams bytes start..end of url into path, resuming from whatever path already holds.
+
+    Data is only resumed with If-Range set to validator, so a file that
+    changed on the origin is fetched again in full instead of being spliced.
+    Without a validator any partial data is dropped.
+    """
+    offset = os.path.getsize(path) if os.path.exists(path) else 0
+    if end is not None and start + offset > end:
+        return  # Segment already complete
+    if offset and not validator:
+        offset = 0  # Nothing to check the partial data against
+    headers = {}
+    if start + offset > 0 or end is not None:
+        headers['Range'] = f"bytes={start + offset}-{'' if end is None else end}"
+        if validator:
+            headers['If-Range'] = validator
+
+    async with limiter.slot(url, 'media') as responded:
+        async with session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT) as response:
+            responded()
+            if response.status == 416 and offset and end is None:
+                if range_total(response) == offset:
+                    return  # The partial file already holds the whole body
+                raise MediaChanged(f"{url} is no longer {offset} bytes long")
+            check_throttling(url, response.status, response.headers)
+            response.raise_for_status()
+            if headers and response.status != 206:
+                if start or end is not None:
+                    if 'If-Range' in headers:
+                        raise MediaChanged(f"{url} changed since its segments were started")
+                    raise ValueError(f"server ignored Range request for {url}")
+                offset = 0  # Changed, or no resume support; start over
+            if not offset and start == 0 and end is None:
+                # A single stream records the version it is about to write
+                write_validator(path, response_validator(response.headers))
+            with open(path, 'ab' if offset else 'wb') as f:
+                await stream_to_file(response, f)
+
+async def probe_media(session, limiter, url):
+    """Returns (size, accepts_ranges, validator) from a HEAD request; size is None when unknown."""
+    async with limiter.slot(url, 'media') as responded:
+        async with session.head(url, allow_redirects=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            responded()
+            check_throttling(url, response.status, response.headers)
+            if response.status >= 400:
+                return None, False, None  # Fall back to a single stream
+            return (response.content_length, response.headers.get('Accept-Ranges') == 'bytes',
+                    response_validator(response.headers))
+
+async def fetch_segments(session, limiter, url, part_path, size, validator=None):
+    """Downloads size bytes as RANGE_PARTS parallel ranges, then joins them into part_path."""
+    step = -(-size // RANGE_PARTS)
+    segments = [
+        (f"{part_path}{i}", start, min(start + step, size) - 1)
+        for i, start in enumerate(range(0, size, step))
+    ]
+    await asyncio.gather(*(
+        fetch_range(session, limiter, url, path, start, end, validator)
+        for path, start, end in segments
+    ))
+    with open(part_path, 'wb') as f:
+        for path, _, _ in segments:
+            with open(path, 'rb') as segment:
+                shutil.copyfileobj(segment, f, MAX_BUFFER)
+    for path, _, _ in segments:
+        os.remove(path)
+
+async def download_to_part(session, limiter, url, part_path):
+    """Fetches url into part_path, resuming partial data only while it matches the origin's version.
+
+    The version's validator is kept next to the partial data; if the file
+    changes mid-download, the partial data is dropped and fetched once more.
+    """
+    for attempt in range(2):
+        try:
+            if not os.path.exists(part_path):
+                size, accepts_ranges, validator = await probe_media(session, limiter, url)
+                if accepts_ranges and size and size >= RANGE_THRESHOLD:
+                    if validator is None or validator != read_validator(part_path):
+                        discard_partial(part_path)  # Segments of another version, or unverifiable
+                    write_validator(part_path, validator)
+                    await fetch_segments(session, limiter, url, part_path, size, validator)
+                    break
+            await fetch_range(session, limiter, url, part_path, validator=read_validator(part_path))
+            break
+        except MediaChanged as e:
+            if attempt:
+                raise
+            print(f"Restarting media {url}: {e}")
+            discard_partial(part_path)
+    write_validator(part_path, None)
+
+async def async_download_media(session, limiter, url, directory, name=None):
+    """Downloads url into MEDIA_STORE and links it into directory; returns the stored path, or None on failure."""
+    try:
+        url = normalize_media_url(url)
+        
+        file_path = media_path(url, directory, name)
+        if media_exists(file_path):
+            return file_path
+        
+        # Partial data lives in .part files so an interrupted run can resume it
+        part_path = file_path + '.part'
+        with metrics.timer('media_download'):
+            for attempt in range(DOWNLOAD_RETRIES + 1):
+                try:
+                    await download_to_part(session, limiter, url, part_path)
+                    break
+                except (Throttled, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if attempt == DOWNLOAD_RETRIES:
+                        raise
+                    delay = retry_delay(attempt, e, DOWNLOAD_BACKOFF)
+                    metrics.count('media_retries')
+                    print(f"Retrying media {url} in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
         
-        # Wait for all tasks to complete
-        concurrent.futures.wait(futures)
+        # Only complete files enter the store and get the final name
+        metrics.count('media_downloaded')
+        metrics.count('media_bytes', os.path.getsize(part_path))
+        stored = store_media(part_path)
+        link_media(stored, file_path, reused=False)
+        print(f"Downloaded media: {file_path}")
+        return stored
+    except Exception as e:
+        metrics.count('media_failed')
+        print(f"Failed to download media {url}: {e}")
+
+class MediaQueue:
+    """Downloads each unique media URL once, on its own workers, and links it into every post using it."""
+
+    def __init__(self, session, limiter, workers=DOWNLOAD_WORKERS, maxsize=MEDIA_QUEUE_SIZE, offline=False):
+        self.session = session
+        self.limiter = limiter
+        # Offline runs only replay cached pages and never download
+        self.offline = offline
+        self.queue = asyncio.Queue(maxsize)
+        self.downloaded = {}  # url -> file path
+        self.waiting = {}     # url -> (directory, name) of every post that needs the file
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def submit(self, url, directory, name=None):
+        url = normalize_media_url(url)
+        if self.offline:
+            return
+        if url in self.downloaded:
+            link_media(self.downloaded[url], media_path(url, directory, name))
+        elif url in self.waiting:
+            self.waiting[url].append((directory, name))
+        else:
+            self.waiting[url] = [(directory, name)]
+            # Blocks the page worker while the backlog is full
+            await self.queue.put(url)
+
+    async def _worker(self):
+        while True:
+            url = await self.queue.get()
+            try:
+                directory, name = self.waiting[url][0]
+                with metrics.tagged(**post_tags(directory)):
+                    file_path = await async_download_media(self.session, self.limiter, url, directory, name)
+                # Failed URLs are forgotten so a later post can try again
+                targets = self.waiting.pop(url)
+                if file_path:
+                    self.downloaded[url] = file_path
+                    for directory, name in targets[1:]:
+                        link_media(file_path, media_path(url, directory, name))
+            except Exception as e:
+                print(f"Failed to link media {url}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        """Waits for the backlog to drain, then stops the workers."""
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+class PagePipeline:
+    """Crawls (location, number) work items through fetch, parse and persist stages.
+
+    The stages run on their own tasks and hand work on through bounded
+    queues. A fetch worker reserves room in the parse stage before it
+    fetches, so at most PARSE_QUEUE_SIZE + parse_workers pages are held at
+    once (being fetched, waiting or being parsed), however many fetch
+    workers there are. A page's HTML and tree are dropped as soon as its
+    post is extracted, so memory stays flat however many pages are crawled.
+    Media goes on to the MediaQueue, the download stage. A page without the
+    post is fetched again with the next keyword variant.
+    """
+
+    def __init__(self, session, limiter, media_queue, base_url, index=None, full=False,
+                 progress=None, fetch_workers=ASYNC_WORKERS, parse_workers=PARSE_WORKERS,
+                 cache=None, offline=False, catalog=None):
+        self.session = session
+        self.catalog = catalog
+        self.cache = cache
+        self.offline = offline
+        self.limiter = limiter
+        self.media_queue = media_queue
+        self.base_url = base_url
+        self.index = index
+        self.full = full
+        self.progress = progress
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        # Holds only small job dicts; the parse stage puts jobs back here to retry them
+        self.fetch_queue = asyncio.Queue()
+        self.parse_queue = asyncio.Queue(PARSE_QUEUE_SIZE)
+        # One slot per page a fetch worker may hold until a parser is done with it
+        self.page_slots = asyncio.Semaphore(PARSE_QUEUE_SIZE + parse_workers)
+        self.persist_queue = asyncio.Queue(PERSIST_QUEUE_SIZE)
+        self.remaining = 0
+        self.finished = asyncio.Event()
+
+    def add(self, download_directory, number):
+        location = location_name(download_directory)
+        entry = None if self.index is None or self.full else self.index.get(location, number)
+        self.fetch_queue.put_nowait({
+            'directory': download_directory, 'location': location, 'number': number, 'entry': entry,
+            'keywords': ordered_keywords(download_directory, number, self.base_url, entry), 'attempt': 0,
+            'retries': 0,
+        })
+        self.remaining += 1
+
+    async def run(self):
+        """Runs the stages until every added work item is finished."""
+        if not self.remaining:
+            return
+        tasks = (
+            [asyncio.create_task(self._fetch()) for _ in range(self.fetch_workers)] +
+            [asyncio.create_task(self._parse()) for _ in range(self.parse_workers)] +
+            [asyncio.create_task(self._persist())]
+        )
+        try:
+            await self.finished.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _done(self, job):
+        if self.progress is not None:
+            self.progress.done(job['directory'])
+        self.remaining -= 1
+        if not self.remaining:
+            self.finished.set()
+
+    def _requeue(self, job, error):
+        """Puts a throttled or timed-out job back on the fetch queue, with the same keyword, after a backoff."""
+        delay = retry_delay(job['retries'], error)
+        job['retries'] += 1
+        metrics.count('page_retries')
+        print(f"Re-queueing page {job['number']} in {delay:.1f}s: {error}")
+        asyncio.get_running_loop().call_later(delay, self.fetch_queue.put_nowait, job)
+
+    def _retry(self, job):
+        """Queues the job's next keyword variant, or gives up on the post."""
+        job['retries'] = 0
+        job['attempt'] += 1
+        if job['attempt'] < len(job['keywords']):
+            self.fetch_queue.put_nowait(job)
+        else:
+            metrics.count('posts_missing')
+            self._done(job)
+
+    async def _fetch(self):
+        while True:
+            job = await self.fetch_queue.get()
+            keyword = job['keywords'][job['attempt']]
+            page_url = f"{self.base_url}?keyword={keyword}"
+            # Released by the parser, or below if the page never reaches it
+            await self.page_slots.acquire()
+            handed_on = False
+            with metrics.tagged(location=job['location'], number=job['number']):
+                print(f"Scraping {page_url}...")
+                try:
+                    cached = cached_page(self.cache, page_url, self.offline)
+                    if cached:
+                        page_html, validators = cached
+                        not_modified = False
+                    else:
+                        async with self.limiter.slot(page_url) as responded:
+                            with metrics.timer('fetch'):
+                                async with self.session.get(page_url, headers=conditional_headers(job['entry'], page_url, self.catalog)) as response:
+                                    responded()
+                                    check_throttling(page_url, response.status, response.headers)
+                                    response.raise_for_status()
+                                    validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                                    not_modified = response.status == 304
+                                    page_html = None if not_modified else await response.text()
+                        metrics.count('pages_fetched')
+                        if self.cache is not None and not not_modified:
+                            self.cache.put(page_url, page_html, *validators)
+
+                    if not_modified:
+                        metrics.count('pages_not_modified')
+                        # Only fetch media that is missing on disk
+                        sub_dir = create_directory(job['directory'], f"{job['number']}")
+                        for mp4_link, name in media_names(self.catalog.get(job['location'], job['number'])['media']):
+                            await self.media_queue.submit(mp4_link, sub_dir, name)
+                        print(f"Not modified: page {job['number']}")
+                        self._done(job)
+                    else:
+                        # The reserved slot guarantees room, so this never waits
+                        await self.parse_queue.put((job, keyword, page_url, validators, page_html))
+                        handed_on = True
+                        page_html = None
+                except (Throttled, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if job['retries'] < PAGE_RETRIES:
+                        self._requeue(job, e)
+                    else:
+                        metrics.count('page_errors')
+                        print(f"Giving up on page {job['number']} with keyword {keyword}: {e}")
+                        self._retry(job)
+                except Exception as e:
+                    metrics.count('page_errors')
+                    print(f"Failed to scrape page {job['number']} with keyword {keyword}: {e}")
+                    self._retry(job)
+                finally:
+                    if not handed_on:
+                        self.page_slots.release()
+
+    async def _parse(self):
+        while True:
+            job, keyword, page_url, validators, page_html = await self.parse_queue.get()
+            with metrics.tagged(location=job['location'], number=job['number']):
+                try:
+                    try:
+                        # Parsing is CPU work; keep it off the event loop
+                        with metrics.timer('parse'):
+                            post = await asyncio.to_thread(extract_post, page_html, keyword)
+                    finally:
+                        page_html = None
+                        self.page_slots.release()
+                    if post:
+                        await self.persist_queue.put((job, page_url, validators, post))
+                    else:
+                        self._retry(job)
+                except Exception as e:
+                    metrics.count('page_errors')
+                    print(f"Failed to scrape page {job['number']} with keyword {keyword}: {e}")
+                    self._retry(job)
+
+    async def _persist(self):
+        while True:
+            job, page_url, validators, post = await self.persist_queue.get()
+            number = job['number']
+            with metrics.tagged(location=job['location'], number=number):
+                try:
+                    metrics.count('posts_found')
+                    sub_dir = save_post(job['directory'], number, post, self.catalog)
+                    
+                    for mp4_link, name in media_names(post['media']):
+                        await self.media_queue.submit(mp4_link, sub_dir, name)
+                    
+                    if self.index is not None:
+                        self.index.put(job['location'], number, page_url, *validators)
+                    print(f"Processed content span {post['index']} for page {number}")
+                except Exception as e:
+                    metrics.count('page_errors')
+                    print(f"Failed to save page {number}: {e}")
+                finally:
+                    self._done(job)
+
+def listing_url(base_url, location, page):
+    url = f"{base_url}?keyword={location}"
+    return url if page == 1 else f"{url}&{LISTING_PAGE_PARAM}={page}"
+
+async def async_discover_location(session, limiter, media_queue, base_url, download_directory,
+                                  start_number, end_number, index=None, cache=None, offline=False, catalog=None):
+    """Fetches the location's listing pages once and assigns every post to its number locally.
+
+    Returns the set of numbers that were found.
+    """
+    location = location_name(download_directory)
+    found = set()
+    seen = set()
+    page = 1
+    retries = 0
+    while page <= MAX_LISTING_PAGES:
+        page_url = listing_url(base_url, location, page)
+        print(f"Scraping {page_url}...")
+        try:
+            cached = cached_page(cache, page_url, offline)
+            if cached:
+                page_html = cached[0]
+            else:
+                async with limiter.slot(page_url) as responded:
+                    with metrics.timer('fetch'):
+                        async with session.get(page_url) as response:
+                            responded()
+                            check_throttling(page_url, response.status, response.headers)
+                            response.raise_for_status()
+                            page_html = await response.text()
+                metrics.count('pages_fetched')
+                if cache is not None:
+                    cache.put(page_url, page_html)
+            with metrics.timer('parse'):
+                posts = await asyncio.to_thread(extract_posts, page_html, location)
+        except (Throttled, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            if retries < PAGE_RETRIES:
+                delay = retry_delay(retries, e)
+                retries += 1
+                metrics.count('page_retries')
+                print(f"Retrying listing page {page} for {location} in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            metrics.count('page_errors')
+            print(f"Failed to scrape listing page {page} for {location}: {e}")
+            break
+        except Exception as e:
+            metrics.count('page_errors')
+            print(f"Failed to scrape listing page {page} for {location}: {e}")
+            break
+
+        # A page that names no new numbers is past the end of the listing
+        fresh = set(posts) - seen
+        if not fresh:
+            break
+        seen |= fresh
+
+        for number in sorted(fresh):
+            if not start_number <= number <= end_number:
+                continue
+            post = posts[number]
+            with metrics.tagged(number=number):
+                metrics.count('posts_found')
+                sub_dir = save_post(download_directory, number, post, catalog)
+                for mp4_link, name in media_names(post['media']):
+                    await media_queue.submit(mp4_link, sub_dir, name)
+            if index is not None:
+                index.put(location, number, page_url, None, None)
+            found.add(number)
+            print(f"Processed content span {post['index']} for page {number}")
+        page += 1
+        retries = 0
+    return found
+
+async def async_main(base_url, dir_list, start_number, end_number,
+                     max_per_host=MAX_PER_HOST, requests_per_second=REQUESTS_PER_SECOND,
+                     workers=ASYNC_WORKERS, index_path=CRAWL_INDEX_PATH, full=False,
+                     download_workers=DOWNLOAD_WORKERS, discovery='keyword', metrics_path=METRICS_PATH,
+                     cache_settings=None, catalog_path=CATALOG_PATH):
+    """Crawls every location through one pooled session, one limiter and one PagePipeline.
+
+    Media found by the pipeline goes to a shared MediaQueue, so scraping
+    and downloading overlap and each URL is fetched once. With discovery='listing'
+    each location's listing is fetched once instead of one search per number.
+    cache_settings (path, ttl, max_bytes, offline) turns on the response cache.
+    """
+    work = build_work_list(dir_list, start_number, end_number)
+    progress = LocationProgress(work)
+
+    limiter = HostLimiter(max_per_host, requests_per_second)
+    index = CrawlIndex(index_path) if index_path else None
+    catalog = PostCatalog(catalog_path)
+    cache = None
+    if cache_settings is not None:
+        cache = ResponseCache(cache_settings['path'], cache_settings['ttl'], cache_settings['max_bytes'])
+    offline = bool(cache_settings and cache_settings['offline'])
+    metrics.start(metrics_path)
+    async with create_session(max_per_host) as session:
+        media_queue = MediaQueue(session, limiter, download_workers, offline=offline)
+
+        async def discover(html_directory):
+            with metrics.tagged(location=location_name(html_directory)):
+                found = await async_discover_location(session, limiter, media_queue, base_url, html_directory,
+                                                      start_number, end_number, index, cache, offline, catalog)
+            metrics.count('posts_missing', progress.total[html_directory] - len(found),
+                          location=location_name(html_directory))
+            print(f"Found {len(found)} of {progress.total[html_directory]} posts in the {html_directory} listing")
+            progress.done(html_directory, progress.total[html_directory])
+
+        if discovery == 'listing':
+            await asyncio.gather(*(discover(html_directory) for html_directory in progress.total))
+        else:
+            pipeline = PagePipeline(session, limiter, media_queue, base_url, index, full, progress, workers,
+                                    cache=cache, offline=offline, catalog=catalog)
+            for html_directory, number in work:
+                pipeline.add(html_directory, number)
+            await pipeline.run()
+        await media_queue.close()
+    if index is not None:
+        index.close()
+    catalog.close()
+    if cache is not None:
+        cache.close()
+    metrics.summary()
+    metrics.close()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scrape keyword pages and media into html/.")
+    parser.add_argument("--engine", choices=["process", "async"], default="async",
+                        help="one process pool, or one asyncio session, for all locations")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"concurrent page workers (default: CPU count for process, {ASYNC_WORKERS} for async)")
+    parser.add_argument("--download-workers", type=int, default=DOWNLOAD_WORKERS,
+                        help="concurrent media downloads (async engine)")
+    parser.add_argument("--max-per-host", type=int, default=MAX_PER_HOST,
+                        help=f"most concurrent requests per host; each host starts at {INITIAL_PER_HOST} and adapts (async engine)")
+    parser.add_argument("--rate", type=float, default=REQUESTS_PER_SECOND,
+                        help="requests per second per host, 0 for unlimited (async engine)")
+    parser.add_argument("--discovery", choices=["keyword", "listing"], default="keyword",
+                        help="one search per post number, or one paged listing per location (async engine)")
+    parser.add_argument("--parser", default=HTML_PARSER,
+                        help=f"BeautifulSoup tree builder for result pages (default: {HTML_PARSER})")
+    parser.add_argument("--metrics", default=METRICS_PATH,
+                        help="JSON-lines file for per-stage metrics; the process engine writes only the summary")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the crawl index and refetch every page")
+    parser.add_argument("--cache-ttl", type=float, default=0,
+                        help=f"serve keyword pages fetched less than this many seconds ago from {CACHE_PATH} "
+                             f"(default: 0, no cache; {CACHE_TTL} is a good development value)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_MAX_BYTES // (1024 * 1024),
+                        help="MiB of cached responses kept before the least recently used are evicted")
+    parser.add_argument("--offline", action="store_true",
+                        help="replay pages from the response cache only, whatever their age, and download no media")
+    parser.add_argument("--import-posts", action="store_true",
+                        help=f"move content.txt and links.txt from earlier crawls into {CATALOG_PATH}, then exit")
+    parser.add_argument("--adopt-media", action="store_true",
+                        help="move media from earlier crawls into the shared media store, then exit")
+    args = parser.parse_args()
+    HTML_PARSER = os.environ['CRAWL_HTML_PARSER'] = args.parser
+
     base_url = "https://wu-massage.com"
     dir_list = [
         "西門定點","中山定點","三重定點","板橋定點",
@@ -162,5 +1369,27 @@ if __name__ == "__main__":
     ]
     start_number = 1
     end_number = 105
-    for download_directory in dir_list:
-        main(base_url, download_directory, start_number, end_number)
\ No newline at end of file
+    cache_settings = None
+    if args.cache_ttl or args.offline:
+        cache_settings = {'path': CACHE_PATH, 'ttl': args.cache_ttl, 'max_bytes': args.cache_size * 1024 * 1024,
+                          'offline': args.offline}
+    if args.import_posts:
+        catalog = PostCatalog()
+        index = CrawlIndex() if os.path.exists(CRAWL_INDEX_PATH) else None
+        for html_directory in dir_list:
+            if os.path.isdir(os.path.join('html', html_directory)):
+                print(f"{html_directory}: imported {import_posts(os.path.join('html', html_directory), catalog, index)} posts into {CATALOG_PATH}")
+        catalog.close()
+    elif args.adopt_media:
+        for html_directory in dir_list:
+            if os.path.isdir(os.path.join('html', html_directory)):
+                print(f"{html_directory}: moved {adopt_media(os.path.join('html', html_directory))} files into {MEDIA_STORE}")
+    elif args.engine == "async":
+        asyncio.run(async_main(base_url, dir_list, start_number, end_number,
+                               args.max_per_host, args.rate, args.workers or ASYNC_WORKERS,
+                               full=args.full, download_workers=args.download_workers,
+                               discovery=args.discovery, metrics_path=args.metrics,
+                               cache_settings=cache_settings))
+    else:
+        crawl_all(base_url, dir_list, start_number, end_number, args.workers, full=args.full,
+                  cache_settings=cache_settings, metrics_path=args.metrics)
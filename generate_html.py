@@ -1,34 +1,60 @@
 import os
+import re
+import unicodedata
 import mimetypes
 import shutil
+import argparse
+import filecmp
+import hashlib
+import json
+import time
+import contextlib
+import concurrent.futures
 
-def generate_post_html(post_title, formatted_content, media_files):
-    """Generates the HTML for a single post."""
-    # Convert newlines to <br> tags
-    formatted_content = formatted_content.replace('\n', '<br>')
-    
-    media_count = len(media_files)
-    media_html = f'<div class="post-media media-count-{("more-4" if media_count > 4 else media_count)}" data-media-count="{media_count}">'
-    
-    # Show only first 5 items
-    visible_items = media_files[:5]
-    remaining_count = len(media_files) - 5 if len(media_files) > 5 else 0
-    
-    for index, media in enumerate(visible_items):
-        # Remove 'html/' from the media file path
-        media = os.path.relpath(media, 'html')
-        mime_type = "video/mp4" if media.endswith(".mp4") else "image/jpeg"
-        if mime_type.startswith("image"):
-            media_html += f'''
-                <div class="media-item media-item-{index + 1}" data-post-index="{post_title}" {f'data-remaining="{remaining_count}"' if index == 4 and remaining_count > 0 else ''}>
-                    <img src="{media}" alt="Media">
+from thumbnails import THUMB_WIDTHS, media_kind, can_make, existing_thumbnails, make_thumbnails
+from media_info import can_probe, probe_dimensions, load_dimensions, save_dimensions
+from precompress import brotli, compression_jobs, compress_file, remove_siblings
+from catalog import CATALOG_PATH, read_location
+
+MEDIA_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.mp4', '.webm')
+# Records what each location page was built from, so unchanged pages are skipped
+MANIFEST_PATH = os.path.join("html", "build_manifest.json")
+# Content-addressed copies of all downloaded media, shared by every page (see crawl.store_media)
+MEDIA_STORE = os.path.join("html", "media")
+# Client-side search: one inverted-index shard per location, listed in index.json
+SEARCH_DIR = os.path.join("html", "search")
+# Characters of post text kept with each search result
+SEARCH_SNIPPET = 80
+# Latin words and digits, or runs of CJK characters; SITE_JS splits queries the same way
+TOKEN_PATTERN = re.compile('[a-z0-9]+|[\u3400-\u9fff\uf900-\ufaff]+')
+# Posts written into a location page; the rest load on scroll in chunks of this size (0 puts all in the page)
+PAGE_SIZE = 20
+
+# Rendered width of the media grid, for the browser to pick a srcset entry
+GRID_SIZES = "(max-width: 640px) 95vw, 600px"
+
+# Post markup; rendering only fills in fields and joins the pieces
+def render_post(post, title, count_class, count, items, content):
+    return f'''
+    <div class="post" id="post-{post}" data-post-index="{title}">
+        <div class="post-title">{title}</div>
+        <div class="post-media media-count-{count_class}" data-media-count="{count}">{items}</div>
+        <div class="post-content">{content}</div>
+    </div>
+    '''
+
+def render_image_item(number, post, remaining, img):
+    return f'''
+                <div class="media-item media-item-{number}" data-post-index="{post}" {remaining}>
+                    {img}
                 </div>'''
-        else:
-            media_html += f'''
-                <div class="media-item media-item-{index + 1}" data-post-index="{post_title}" {f'data-remaining="{remaining_count}"' if index == 4 and remaining_count > 0 else ''}>
+
+def render_video_item(number, post, remaining, attributes, src):
+    return f'''
+                <div class="media-item media-item-{number}" data-post-index="{post}" {remaining}>
                     <div class="video-container">
-                        <video class="media-video" controls>
-                            <source src="{media}" type="{mime_type}">
+                        <video class="media-video" controls{attributes}>
+                            <source src="{src}" type="video/mp4">
                             Your browser does not support the video tag.
                         </video>
                         <div class="video-overlay">
@@ -36,19 +62,634 @@ def generate_post_html(post_title, formatted_content, media_files):
                         </div>
                     </div>
                 </div>'''
+
+def render_thumbnail(src, srcset, sizes, full, size, loading):
+    return (f'<img src="{src}" srcset="{srcset}" sizes="{sizes}" data-full="{full}"{size} '
+            f'loading="{loading}" decoding="async" alt="Media">')
+
+def render_image(src, size, loading):
+    return f'<img src="{src}"{size} loading="{loading}" decoding="async" alt="Media">'
+
+def render_size(width, height):
+    return f' width="{width}" height="{height}"'
+
+# The fifth item shows how many more are hidden
+VISIBLE_MEDIA = 5
+SITE_PREFIX = "html" + os.sep
+
+def site_path(path):
+    """path relative to html/, without a relpath call for the usual html/... paths."""
+    if path.startswith(SITE_PREFIX) and ".." not in path:
+        return path[len(SITE_PREFIX):].lstrip(os.sep)
+    return os.path.relpath(path, "html")
+
+def generate_post_html(post_title, formatted_content, media_files, media_meta=None, lazy=True):
+    """Generates the HTML for a single post.
+
+    media_meta maps a media file to what the generator knows about it: its
+    "src" in the shared media store, its intrinsic "size" as [width, height],
+    a "srcset" list of (path, width) thumbnails for images and a "poster"
+    path for videos. Media without thumbnails is shown at full size. With
+    lazy, the browser defers media until it nears the viewport; the first
+    post on a page should pass False.
+    """
+    media_meta = media_meta or {}
+    loading = "lazy" if lazy else "eager"
+    # Convert newlines to <br> tags
+    formatted_content = formatted_content.replace('\n', '<br>')
     
-    media_html += '</div>'
-    post_title = formatted_content.split('<br>')[0]
-    return f'''
-    <div class="post" data-post-index="{post_title}">
-        <div class="post-title">{post_title}</div>
-        {media_html}
-        <div class="post-content">{formatted_content}</div>
-    </div>
-    '''
+    media_count = len(media_files)
+    remaining_count = media_count - VISIBLE_MEDIA if media_count > VISIBLE_MEDIA else 0
+    items = []
+    for index, media in enumerate(media_files[:VISIBLE_MEDIA]):
+        meta = media_meta.get(media, {})
+        # Intrinsic size lets the browser reserve the box before the file arrives
+        size_attributes = render_size(*meta["size"]) if meta.get("size") else ""
+        # Remove 'html/' from the media file path; the shared copy lets browsers cache it across pages
+        media = meta.get("src") or site_path(media)
+        remaining = f'data-remaining="{remaining_count}"' if index == VISIBLE_MEDIA - 1 and remaining_count else ''
+        if not media.endswith(".mp4"):
+            if meta.get("srcset"):
+                # The grid loads a thumbnail; the modal opens the original from data-full
+                img_html = render_thumbnail(
+                    src=meta["srcset"][0][0], sizes=GRID_SIZES, full=media, size=size_attributes, loading=loading,
+                    srcset=", ".join([f"{path} {width}w" for path, width in meta["srcset"]]),
+                )
+            else:
+                img_html = render_image(src=media, size=size_attributes, loading=loading)
+            items.append(render_image_item(number=index + 1, post=post_title, remaining=remaining, img=img_html))
+        else:
+            # With a poster frame the grid need not fetch any of the video; without one,
+            # only the metadata of videos on screen is fetched to draw the first frame
+            if meta.get("poster"):
+                video_attributes = f' preload="none" poster="{meta["poster"]}"'
+            else:
+                video_attributes = f' preload="{"none" if lazy else "metadata"}"'
+            items.append(render_video_item(
+                number=index + 1, post=post_title, remaining=remaining, src=media,
+                attributes=video_attributes + size_attributes,
+            ))
+    
+    return render_post(
+        post=post_title, title=formatted_content.split('<br>', 1)[0], content=formatted_content, items="".join(items),
+        count_class="more-4" if media_count > 4 else media_count, count=media_count,
+    )
 
-def generate_html(posts, current_location, valid_locations):
-    """Generates the complete HTML page with embedded JavaScript and Facebook-like styling."""
+NO_POSTS_HTML = '''
+        <div class="post no-posts">
+            <div class="post-content">目前尚無貼文</div>
+        </div>
+        '''
+
+SITE_CSS = '''
+body {
+    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
+    background-color: #f0f2f5;
+    margin: 0;
+    padding: 0;
+}
+.container {
+    width: 95%;
+    max-width: 600px;
+    margin: 0 auto;
+    padding-top: 10px;
+    padding: 10px 5px;
+}
+.post {
+    background-color: white;
+    border-radius: 8px;
+    box-shadow: 0 1px 2px rgba(0, 0, 0, 0.1);
+    margin: 15px auto;
+    overflow: hidden;
+    box-sizing: border-box;
+}
+.post-title {
+    font-size: 15px;
+    font-weight: 600;
+    color: #1c1e21;
+    padding: 12px 16px;
+    border-bottom: 1px solid #eff1f3;
+}
+.post-content {
+    font-size: 15px;
+    color: #1c1e21;
+    padding: 12px 16px;
+    white-space: pre-line;
+    line-height: 1.5;
+}
+.post-media {
+    display: grid;
+    grid-gap: 2px;
+    max-width: 95%;
+    overflow: hidden;
+    margin: 0 auto;
+}
+.post-media .media-item {
+    position: relative;
+    overflow: hidden;
+    cursor: pointer;
+    height: 100%;
+}
+.post-media img, .post-media video {
+    width: 100%;
+    height: 100%;
+    object-fit: cover;
+}
+.modal {
+    display: none;
+    position: fixed;
+    z-index: 1000;
+    left: 0;
+    top: 0;
+    width: 100%;
+    height: 100%;
+    overflow: auto;
+    background-color: rgba(0,0,0,0.8);
+}
+.modal-content {
+    position: relative;
+    margin: auto;
+    padding: 0;
+    width: 80%;
+    max-width: 700px;
+}
+.close {
+    position: absolute;
+    top: 10px;
+    right: 25px;
+    color: white;
+    font-size: 35px;
+    font-weight: bold;
+    cursor: pointer;
+}
+.modal-media {
+    width: 100%;
+    height: auto;
+}
+.modal .video-overlay {
+    display: none;
+}
+.modal .play-icon {
+    display: none;
+}
+.prev, .next {
+    cursor: pointer;
+    position: absolute;
+    top: 50%;
+    width: auto;
+    padding: 16px;
+    margin-top: -50px;
+    color: white;
+    font-weight: bold;
+    font-size: 20px;
+    transition: 0.6s ease;
+    border-radius: 0 3px 3px 0;
+    user-select: none;
+}
+.next {
+    right: 0;
+    border-radius: 3px 0 0 3px;
+}
+.prev:hover, .next:hover {
+    background-color: rgba(0,0,0,0.8);
+}
+/* Single image */
+.media-count-1 {
+    grid-template-columns: 1fr;
+    aspect-ratio: 2/3;
+}
+/* Two images */
+.media-count-2 {
+    grid-template-columns: repeat(2, 1fr);
+    aspect-ratio: 16/9;
+}
+/* Three images */
+.media-count-3 {
+    grid-template-columns: 2fr 1fr;
+    grid-template-rows: repeat(2, 1fr);
+    aspect-ratio: 4/3;
+}
+.media-count-3 .media-item-1 {
+    grid-row: 1 / span 2;
+}
+/* Four images */
+.media-count-4 {
+    grid-template-columns: repeat(2, 1fr);
+    grid-template-rows: repeat(2, 1fr);
+    aspect-ratio: 1/1;
+}
+/* Five or more images */
+.media-count-more-4 {
+    grid-template-columns: repeat(6, 1fr);
+    grid-template-rows: 2fr 1fr;
+    aspect-ratio: 3/4;
+}
+.media-count-more-4 .media-item-1 {
+    grid-column: span 3;
+    grid-row: 1;
+}
+.media-count-more-4 .media-item-2 {
+    grid-column: span 3;
+    grid-row: 1;
+}
+.media-count-more-4 .media-item-3,
+.media-count-more-4 .media-item-4,
+.media-count-more-4 .media-item-5 {
+    grid-column: span 2;
+    grid-row: 2;
+}
+.media-count-more-4 .media-item-5[data-remaining]::after {
+    content: '+' attr(data-remaining);
+    position: absolute;
+    top: 0;
+    left: 0;
+    width: 100%;
+    height: 100%;
+    background: rgba(0, 0, 0, 0.4);
+    color: white;
+    display: flex;
+    align-items: center;
+    justify-content: center;
+    font-size: 24px;
+    font-weight: bold;
+}
+/* Video Container Styles */
+.video-container {
+    position: relative;
+    width: 100%;
+    height: 100%;
+}
+.video-overlay {
+    position: absolute;
+    top: 50%;
+    left: 50%;
+    width: 64px;
+    height: 64px;
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    background: rgba(0, 0, 0, 0.3);
+    opacity: 1;
+    transition: opacity 0.3s;
+    pointer-events: none;
+    z-index: 10;
+    display: none;
+}
+.play-icon {
+    width: 64px;
+    height: 64px;
+    opacity: 0.9;
+    display: none;
+}
+.nav-bar {
+    position: sticky;
+    top: 0;
+    background: white;
+    box-shadow: 0 1px 2px rgba(0, 0, 0, 0.1);
+    padding: 10px 0;
+    z-index: 100;
+    display: flex;
+    flex-wrap: wrap;
+    justify-content: center;
+    align-items: center;
+    width: 100%;
+    max-width: 600px;
+    margin: 0 auto;
+}
+.nav-item {
+    padding: 8px 16px;
+    color: #1c1e21;
+    text-decoration: none;
+    white-space: nowrap;
+    border-radius: 18px;
+    margin: 4px;
+    transition: background-color 0.2s;
+    font-size: 14px;
+}
+.nav-item:hover {
+    background-color: #f0f2f5;
+}
+.nav-item.active {
+    background-color: #e7f3ff;
+    color: #1877f2;
+    font-weight: bold;
+}
+.no-posts {
+    background-color: white;
+    border-radius: 8px;
+    text-align: center;
+    color: #65676b;
+    padding: 20px;
+    margin: 15px 0;
+}
+.load-more {
+    min-height: 1px;
+}
+.search {
+    position: relative;
+    width: 100%;
+    padding: 4px 12px;
+    box-sizing: border-box;
+}
+.search-box {
+    width: 100%;
+    padding: 8px 14px;
+    border: none;
+    border-radius: 18px;
+    background-color: #f0f2f5;
+    font-size: 14px;
+    box-sizing: border-box;
+}
+.search-results {
+    position: absolute;
+    left: 12px;
+    right: 12px;
+    max-height: 60vh;
+    overflow-y: auto;
+    background: white;
+    border-radius: 8px;
+    box-shadow: 0 2px 8px rgba(0, 0, 0, 0.2);
+    z-index: 200;
+}
+.search-results:empty {
+    display: none;
+}
+.search-result {
+    display: block;
+    padding: 8px 14px;
+    color: #1c1e21;
+    text-decoration: none;
+    font-size: 14px;
+    border-bottom: 1px solid #eff1f3;
+}
+.search-result:hover {
+    background-color: #f0f2f5;
+}
+.search-result small {
+    display: block;
+    color: #65676b;
+}
+'''
+
+SITE_JS = '''
+let currentSlideIndex = 0;
+const modal = document.getElementById("myModal");
+const modalImage = document.getElementById("modalImage");
+const modalVideo = document.getElementById("modalVideo");
+const closeModal = document.getElementsByClassName("close")[0];
+
+// One delegated listener also covers posts loaded later from chunk files
+document.addEventListener('click', (event) => {
+    const target = event.target.closest('.media-item img, .media-item video');
+    if (!target || target.classList.contains('play-icon')) {
+        return;
+    }
+    const postContainer = target.closest('.post');
+
+    // Filter media items within the same post
+    const postMediaItems = postContainer.querySelectorAll('.media-item img, .media-item video');
+    const postMediaArray = Array.from(postMediaItems).filter(media => !media.src.includes('icon-play.png'));
+    currentSlideIndex = postMediaArray.indexOf(target);
+
+    function showPostSlide(index) {
+        const media = postMediaArray[index];
+        const sourceMedia = media.tagName === 'IMG' ? media : media.querySelector('source');
+        const videoOverlay = media.closest('.media-item').querySelector('.video-overlay');
+
+        if (media.tagName === 'IMG') {
+            modalImage.src = media.dataset.full || sourceMedia.src;
+            modalImage.style.display = "block";
+            modalVideo.style.display = "none";
+        } else {
+            modalVideo.src = sourceMedia.src;
+            modalVideo.style.display = "block";
+            modalImage.style.display = "none";
+            if (videoOverlay) {
+                videoOverlay.style.display = "none";
+            }
+        }
+    }
+
+    function changePostSlide(n) {
+        currentSlideIndex = (currentSlideIndex + n + postMediaArray.length) % postMediaArray.length;
+        showPostSlide(currentSlideIndex);
+    }
+
+    showPostSlide(currentSlideIndex);
+    modal.style.display = "block";
+
+    // Override global slide change functions for this post's media
+    window.changeSlide = changePostSlide;
+});
+
+// Posts beyond the first page live in <location>.<n>.json and are appended near the end of the page
+const loader = document.querySelector('.load-more');
+let nextChunk = 1;
+let chunkRequest = null;
+
+// Resolves to false once every chunk is on the page
+function loadNextChunk() {
+    if (!loader || !loader.isConnected) {
+        return Promise.resolve(false);
+    }
+    if (!chunkRequest) {
+        const chunkBase = encodeURIComponent(loader.dataset.chunkBase);
+        const chunkCount = parseInt(loader.dataset.chunkCount, 10);
+        chunkRequest = fetch(`${chunkBase}.${nextChunk}.json`)
+            .then((response) => response.json())
+            .then((chunk) => {
+                loader.insertAdjacentHTML('beforebegin', chunk.posts.join('\\n'));
+                nextChunk += 1;
+                if (nextChunk > chunkCount) {
+                    loader.remove();
+                }
+                return true;
+            })
+            .finally(() => {
+                chunkRequest = null;
+            });
+    }
+    return chunkRequest;
+}
+
+if (loader) {
+    const observer = new IntersectionObserver((entries) => {
+        if (!entries[0].isIntersecting || chunkRequest) {
+            return;
+        }
+        loadNextChunk()
+            .then(() => {
+                observer.unobserve(loader);
+                if (loader.isConnected) {
+                    // Re-observing fires again right away if the loader is still in view
+                    observer.observe(loader);
+                }
+            })
+            .catch(() => {});
+    }, { rootMargin: '800px' });
+    observer.observe(loader);
+}
+
+// Search results link to #post-<n>, which may sit in a chunk that is not loaded yet
+async function revealPost() {
+    const id = decodeURIComponent(window.location.hash.slice(1));
+    if (!id.startsWith('post-')) {
+        return;
+    }
+    while (!document.getElementById(id)) {
+        if (!(await loadNextChunk().catch(() => false))) {
+            return;
+        }
+    }
+    document.getElementById(id).scrollIntoView();
+}
+revealPost();
+window.addEventListener('hashchange', revealPost);
+
+// Post search over every location; the index shards are fetched on first use
+const searchBox = document.querySelector('.search-box');
+const searchResults = document.querySelector('.search-results');
+const SEARCH_LIMIT = 50;
+let searchShards = null;
+
+function loadSearchShards() {
+    if (!searchShards) {
+        searchShards = fetch('search/index.json')
+            .then((response) => response.json())
+            .then((index) => Promise.all(index.shards.map(
+                (shard) => fetch(shard.file).then((response) => response.json())
+            )));
+        searchShards.catch(() => {
+            searchShards = null;
+        });
+    }
+    return searchShards;
+}
+
+// Same split as search_terms in generate_html.py: words, and CJK runs as character pairs
+function searchTerms(text) {
+    const terms = [];
+    for (const run of text.normalize('NFKC').toLowerCase().match(/[a-z0-9]+|[\\u3400-\\u9fff\\uf900-\\ufaff]+/g) || []) {
+        if (/^[a-z0-9]/.test(run) || run.length === 1) {
+            terms.push(run);
+        } else {
+            for (let i = 0; i < run.length - 1; i++) {
+                terms.push(run.slice(i, i + 2));
+            }
+        }
+    }
+    return terms;
+}
+
+// Posts of a shard containing every term; a term also matches longer index terms it starts
+function matchShard(shard, terms) {
+    let matched = null;
+    for (const term of terms) {
+        const posts = new Set();
+        for (const key in shard.terms) {
+            if (key.startsWith(term)) {
+                shard.terms[key].forEach((post) => posts.add(post));
+            }
+        }
+        matched = matched === null ? posts : new Set([...matched].filter((post) => posts.has(post)));
+        if (!matched.size) {
+            break;
+        }
+    }
+    return matched ? [...matched] : [];
+}
+
+function showSearchResults(shards, query) {
+    const terms = searchTerms(query);
+    searchResults.replaceChildren();
+    if (!terms.length) {
+        return;
+    }
+    let shown = 0;
+    for (const shard of shards) {
+        for (const post of matchShard(shard, terms)) {
+            if (shown++ === SEARCH_LIMIT) {
+                return;
+            }
+            const [postDir, title, snippet] = shard.posts[post];
+            const link = document.createElement('a');
+            link.className = 'search-result';
+            link.href = `${encodeURIComponent(shard.location)}.html#post-${encodeURIComponent(postDir)}`;
+            link.textContent = `${shard.location} · ${title}`;
+            const detail = document.createElement('small');
+            detail.textContent = snippet;
+            link.appendChild(detail);
+            searchResults.appendChild(link);
+        }
+    }
+    if (!shown) {
+        const empty = document.createElement('div');
+        empty.className = 'search-result';
+        empty.textContent = '找不到符合的貼文';
+        searchResults.appendChild(empty);
+    }
+}
+
+if (searchBox) {
+    searchBox.addEventListener('focus', () => loadSearchShards().catch(() => {}), { once: true });
+    searchBox.addEventListener('input', () => {
+        const query = searchBox.value;
+        loadSearchShards()
+            .then((shards) => {
+                // Ignore answers to queries the reader has already typed past
+                if (searchBox.value === query) {
+                    showSearchResults(shards, query);
+                }
+            })
+            .catch(() => {});
+    });
+    searchResults.addEventListener('click', () => {
+        searchResults.replaceChildren();
+    });
+}
+
+closeModal.onclick = function() {
+    modal.style.display = "none";
+}
+
+window.onclick = function(event) {
+    if (event.target == modal) {
+        modal.style.display = "none";
+    }
+}
+
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'ArrowLeft') {
+        window.changeSlide(-1);
+    } else if (event.key === 'ArrowRight') {
+        window.changeSlide(1);
+    } else if (event.key === 'Escape') {
+        modal.style.display = "none";
+    }
+});
+'''
+
+def asset_name(kind, text):
+    """Content-hashed file name, so a page always points at the matching asset."""
+    return f"site.{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}.{kind}"
+
+SITE_CSS_NAME = asset_name("css", SITE_CSS)
+SITE_JS_NAME = asset_name("js", SITE_JS)
+
+def write_static_assets(output_dir="html"):
+    """Writes the shared stylesheet and script once, and removes outdated versions."""
+    for name, text in ((SITE_CSS_NAME, SITE_CSS), (SITE_JS_NAME, SITE_JS)):
+        path = os.path.join(output_dir, name)
+        if not os.path.exists(path):
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+    for name in os.listdir(output_dir):
+        if name.startswith("site.") and name.endswith((".css", ".js")) and name not in (SITE_CSS_NAME, SITE_JS_NAME):
+            os.remove(os.path.join(output_dir, name))
+
+def generate_page_header(current_location, valid_locations):
+    """Generates everything before the posts: head, stylesheet link, navigation and the container opening."""
     
     # Generate navigation links
     nav_links = []
@@ -59,14 +700,6 @@ def generate_html(posts, current_location, valid_locations):
         )
     nav_html = "\n".join(nav_links)
     
-    if not posts:
-        posts_html = '''
-        <div class="post no-posts">
-            <div class="post-content">目前尚無貼文</div>
-        </div>
-        '''
-    else:
-        posts_html = "\n".join(posts)
     return f'''
     <!DOCTYPE html>
     <html lang="en">
@@ -74,256 +707,26 @@ def generate_html(posts, current_location, valid_locations):
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>{current_location}</title>
-        <style>
-            body {{
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Helvetica, Arial, sans-serif;
-                background-color: #f0f2f5;
-                margin: 0;
-                padding: 0;
-            }}
-            .container {{
-                width: 95%;
-                max-width: 600px;
-                margin: 0 auto;
-                padding-top: 10px;
-                padding: 10px 5px;
-            }}
-            .post {{
-                background-color: white;
-                border-radius: 8px;
-                box-shadow: 0 1px 2px rgba(0, 0, 0, 0.1);
-                margin: 15px auto;
-                overflow: hidden;
-                box-sizing: border-box;
-            }}
-            .post-title {{
-                font-size: 15px;
-                font-weight: 600;
-                color: #1c1e21;
-                padding: 12px 16px;
-                border-bottom: 1px solid #eff1f3;
-            }}
-            .post-content {{
-                font-size: 15px;
-                color: #1c1e21;
-                padding: 12px 16px;
-                white-space: pre-line;
-                line-height: 1.5;
-            }}
-            .post-media {{
-                display: grid;
-                grid-gap: 2px;
-                max-width: 95%;
-                overflow: hidden;
-                margin: 0 auto;
-            }}
-            .post-media .media-item {{
-                position: relative;
-                overflow: hidden;
-                cursor: pointer;
-                height: 100%;
-            }}
-            .post-media img, .post-media video {{
-                width: 100%;
-                height: 100%;
-                object-fit: cover;
-            }}
-            .modal {{
-                display: none;
-                position: fixed;
-                z-index: 1000;
-                left: 0;
-                top: 0;
-                width: 100%;
-                height: 100%;
-                overflow: auto;
-                background-color: rgba(0,0,0,0.8);
-            }}
-            .modal-content {{
-                position: relative;
-                margin: auto;
-                padding: 0;
-                width: 80%;
-                max-width: 700px;
-            }}
-            .close {{
-                position: absolute;
-                top: 10px;
-                right: 25px;
-                color: white;
-                font-size: 35px;
-                font-weight: bold;
-                cursor: pointer;
-            }}
-            .modal-media {{
-                width: 100%;
-                height: auto;
-            }}
-            .modal .video-overlay {{
-                display: none;
-            }}
-            .modal .play-icon {{
-                display: none;
-            }}
-            .prev, .next {{
-                cursor: pointer;
-                position: absolute;
-                top: 50%;
-                width: auto;
-                padding: 16px;
-                margin-top: -50px;
-                color: white;
-                font-weight: bold;
-                font-size: 20px;
-                transition: 0.6s ease;
-                border-radius: 0 3px 3px 0;
-                user-select: none;
-            }}
-            .next {{
-                right: 0;
-                border-radius: 3px 0 0 3px;
-            }}
-            .prev:hover, .next:hover {{
-                background-color: rgba(0,0,0,0.8);
-            }}
-            /* Single image */
-            .media-count-1 {{
-                grid-template-columns: 1fr;
-                aspect-ratio: 2/3;
-            }}
-            /* Two images */
-            .media-count-2 {{
-                grid-template-columns: repeat(2, 1fr);
-                aspect-ratio: 16/9;
-            }}
-            /* Three images */
-            .media-count-3 {{
-                grid-template-columns: 2fr 1fr;
-                grid-template-rows: repeat(2, 1fr);
-                aspect-ratio: 4/3;
-            }}
-            .media-count-3 .media-item-1 {{
-                grid-row: 1 / span 2;
-            }}
-            /* Four images */
-            .media-count-4 {{
-                grid-template-columns: repeat(2, 1fr);
-                grid-template-rows: repeat(2, 1fr);
-                aspect-ratio: 1/1;
-            }}
-            /* Five or more images */
-            .media-count-more-4 {{
-                grid-template-columns: repeat(6, 1fr);
-                grid-template-rows: 2fr 1fr;
-                aspect-ratio: 3/4;
-            }}
-            .media-count-more-4 .media-item-1 {{
-                grid-column: span 3;
-                grid-row: 1;
-            }}
-            .media-count-more-4 .media-item-2 {{
-                grid-column: span 3;
-                grid-row: 1;
-            }}
-            .media-count-more-4 .media-item-3,
-            .media-count-more-4 .media-item-4,
-            .media-count-more-4 .media-item-5 {{
-                grid-column: span 2;
-                grid-row: 2;
-            }}
-            .media-count-more-4 .media-item-5[data-remaining]::after {{
-                content: '+' attr(data-remaining);
-                position: absolute;
-                top: 0;
-                left: 0;
-                width: 100%;
-                height: 100%;
-                background: rgba(0, 0, 0, 0.4);
-                color: white;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                font-size: 24px;
-                font-weight: bold;
-            }}
-            /* Video Container Styles */
-            .video-container {{
-                position: relative;
-                width: 100%;
-                height: 100%;
-            }}
-            .video-overlay {{
-                position: absolute;
-                top: 50%;
-                left: 50%;
-                width: 64px;
-                height: 64px;
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                background: rgba(0, 0, 0, 0.3);
-                opacity: 1;
-                transition: opacity 0.3s;
-                pointer-events: none;
-                z-index: 10;
-                display: none;
-            }}
-            .play-icon {{
-                width: 64px;
-                height: 64px;
-                opacity: 0.9;
-                display: none;
-            }}
-            .nav-bar {{
-                position: sticky;
-                top: 0;
-                background: white;
-                box-shadow: 0 1px 2px rgba(0, 0, 0, 0.1);
-                padding: 10px 0;
-                z-index: 100;
-                display: flex;
-                flex-wrap: wrap;
-                justify-content: center;
-                align-items: center;
-                width: 100%;
-                max-width: 600px;
-                margin: 0 auto;
-            }}
-            .nav-item {{
-                padding: 8px 16px;
-                color: #1c1e21;
-                text-decoration: none;
-                white-space: nowrap;
-                border-radius: 18px;
-                margin: 4px;
-                transition: background-color 0.2s;
-                font-size: 14px;
-            }}
-            .nav-item:hover {{
-                background-color: #f0f2f5;
-            }}
-            .nav-item.active {{
-                background-color: #e7f3ff;
-                color: #1877f2;
-                font-weight: bold;
-            }}
-            .no-posts {{
-                background-color: white;
-                border-radius: 8px;
-                text-align: center;
-                color: #65676b;
-                padding: 20px;
-                margin: 15px 0;
-            }}
-        </style>
+        <link rel="stylesheet" href="{SITE_CSS_NAME}">
     </head>
     <body>
         <div class="nav-bar">
             {nav_html}
+            <div class="search">
+                <input type="search" class="search-box" placeholder="搜尋貼文" aria-label="搜尋貼文">
+                <div class="search-results"></div>
+            </div>
         </div>
         <div class="container">
-            {posts_html}
-        </div>
+            '''
+
+def generate_page_footer(chunk_count=0, chunk_base=""):
+    """Generates everything after the posts: the chunk loader, the modal and the script tag."""
+    loader = ""
+    if chunk_count:
+        loader = f'            <div class="load-more" data-chunk-base="{chunk_base}" data-chunk-count="{chunk_count}"></div>\n'
+    return f'''
+{loader}        </div>
         
         <div id="myModal" class="modal">
             <span class="close">&times;</span>
@@ -335,100 +738,408 @@ def generate_html(posts, current_location, valid_locations):
             </div>
         </div>
 
-        <script>
-            let currentSlideIndex = 0;
-            const modal = document.getElementById("myModal");
-            const modalImage = document.getElementById("modalImage");
-            const modalVideo = document.getElementById("modalVideo");
-            const closeModal = document.getElementsByClassName("close")[0];
-
-            document.querySelectorAll('.media-item img, .media-item video').forEach((item) => {{
-                item.addEventListener('click', (event) => {{
-                    const postContainer = event.target.closest('.post');
-                    const postIndex = postContainer.getAttribute('data-post-index');
-                    
-                    // Filter media items within the same post
-                    const postMediaItems = postContainer.querySelectorAll('.media-item img, .media-item video');
-                    const postMediaArray = Array.from(postMediaItems).filter(media => !media.src.includes('icon-play.png'));
-                    currentSlideIndex = postMediaArray.indexOf(event.target);
-                    
-                    function showPostSlide(index) {{
-                        const media = postMediaArray[index];
-                        const sourceMedia = media.tagName === 'IMG' ? media : media.querySelector('source');
-                        const videoOverlay = media.closest('.media-item').querySelector('.video-overlay');
-                        
-                        if (media.tagName === 'IMG') {{
-                            modalImage.src = sourceMedia.src;
-                            modalImage.style.display = "block";
-                            modalVideo.style.display = "none";
-                        }} else {{
-                            modalVideo.src = sourceMedia.src;
-                            modalVideo.style.display = "block";
-                            modalImage.style.display = "none";
-                            if (videoOverlay) {{
-                                videoOverlay.style.display = "none";
-                            }}
-                        }}
-                    }}
-
-                    function changePostSlide(n) {{
-                        currentSlideIndex = (currentSlideIndex + n + postMediaArray.length) % postMediaArray.length;
-                        showPostSlide(currentSlideIndex);
-                    }}
-
-                    showPostSlide(currentSlideIndex);
-                    modal.style.display = "block";
-
-                    // Override global slide change functions for this post's media
-                    window.changeSlide = changePostSlide;
-                }});
-            }});
-
-            closeModal.onclick = function() {{
-                modal.style.display = "none";
-            }}
-
-            window.onclick = function(event) {{
-                if (event.target == modal) {{
-                    modal.style.display = "none";
-                }}
-            }}
-
-            document.addEventListener('keydown', function(event) {{
-                if (event.key === 'ArrowLeft') {{
-                    window.changeSlide(-1);
-                }} else if (event.key === 'ArrowRight') {{
-                    window.changeSlide(1);
-                }} else if (event.key === 'Escape') {{
-                    modal.style.display = "none";
-                }}
-            }});
-        </script>
+        <script src="{SITE_JS_NAME}"></script>
     </body>
     </html>
     '''
 
+def generate_html(posts, current_location, valid_locations):
+    """Generates the complete HTML page, linking the shared Facebook-like styling and JavaScript."""
+    posts_html = "\n".join(posts) if posts else NO_POSTS_HTML
+    return f"{generate_page_header(current_location, valid_locations)}{posts_html}{generate_page_footer()}"
+
+def write_chunk(chunk_file, posts):
+    with open(chunk_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"posts": posts}, f, ensure_ascii=False)
+    replace_if_changed(chunk_file + ".tmp", chunk_file)
+
+def remove_stale_chunks(chunk_base, chunk_count):
+    """Deletes <chunk_base>.<n>.json files left over from a build with more chunks."""
+    directory, prefix = os.path.split(chunk_base)
+    for name in os.listdir(directory or "."):
+        number = name[len(prefix) + 1:-len(".json")]
+        if name.startswith(prefix + ".") and name.endswith(".json") and number.isdigit() and int(number) > chunk_count:
+            os.remove(os.path.join(directory, name))
+
+def write_page(output_file, posts, current_location, valid_locations, page_size=0, chunk_base=None):
+    """Streams a page to output_file, writing each post as the posts iterable produces it.
+
+    With a page_size, only the first page_size posts go into the page; the
+    rest are written page_size at a time to <chunk_base>.<n>.json, which the
+    page fetches as the reader scrolls. chunk_base defaults to output_file
+    without its extension. Returns the number of posts written.
+    """
+    if chunk_base is None:
+        chunk_base = os.path.splitext(output_file)[0]
+    count = 0
+    chunk = []
+    chunk_count = 0
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(generate_page_header(current_location, valid_locations))
+        for post_html in posts:
+            if not page_size or count < page_size:
+                if count:
+                    f.write("\n")
+                f.write(post_html)
+            else:
+                chunk.append(post_html)
+                if len(chunk) == page_size:
+                    chunk_count += 1
+                    write_chunk(f"{chunk_base}.{chunk_count}.json", chunk)
+                    chunk = []
+            count += 1
+        if chunk:
+            chunk_count += 1
+            write_chunk(f"{chunk_base}.{chunk_count}.json", chunk)
+        if not count:
+            f.write(NO_POSTS_HTML)
+        f.write(generate_page_footer(chunk_count, os.path.basename(chunk_base)))
+    remove_stale_chunks(chunk_base, chunk_count)
+    return count
+
+def iter_posts(base_directory, media_meta=None, post_records=None, catalog_posts=None):
+    """Yields the HTML of each post in a location directory, one at a time.
+
+    Posts and their media come from post_records (see scan_location), so the
+    directory is not listed again, and their text from catalog_posts, the
+    location's catalog entries; whichever is missing is read here. Only
+    the first post loads its media eagerly; the rest are lazy.
+    """
+    if catalog_posts is None:
+        catalog_posts = read_location(os.path.basename(os.path.normpath(base_directory)))
+    if post_records is None:
+        post_records = scan_location(base_directory, {}, catalog_posts)
+    first = True
+    for post_dir, record in post_records.items():
+        post_path = os.path.join(base_directory, post_dir)
+        post_content = catalog_posts[post_dir]["content"]
+        
+        # Ensure the content ends with a new line
+        if not post_content.endswith('\n'):
+            post_content += '\n'
+        
+        media_files = [os.path.join(post_path, name) for name in record["media"]]
+        yield generate_post_html(post_dir, post_content, media_files, media_meta, lazy=not first)
+        first = False
+
 def main(base_directory, posts):
     """Processes a single directory to generate posts."""
-    for post_dir in os.listdir(base_directory):
-        post_path = os.path.join(base_directory, post_dir)
-        if os.path.isdir(post_path):
-            content_file = os.path.join(post_path, "content.txt")
-            if os.path.exists(content_file):
-                with open(content_file, "r", encoding="utf-8") as f:
-                    post_content = f.read()
-                
-                # Ensure the content ends with a new line
-                if not post_content.endswith('\n'):
-                    post_content += '\n'
-                
-                media_files = [
-                    os.path.join(post_path, f) 
-                    for f in os.listdir(post_path) 
-                    if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.mp4', '.webm'))
-                ]
-                post_html = generate_post_html(post_dir, post_content, media_files)
-                posts.append(post_html)
+    posts.extend(iter_posts(base_directory))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_record(path, previous, stat=None):
+    """Size, mtime and content hash of path; the hash is reused while size and mtime are unchanged."""
+    stat = stat or os.stat(path)
+    if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime_ns:
+        return previous
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": file_sha256(path)}
+
+def scan_post(post_path, previous):
+    """Records the media files of one post directory in a single listing."""
+    media = {}
+    previous_media = previous.get("media", {})
+    with os.scandir(post_path) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(MEDIA_EXTENSIONS) and entry.is_file():
+                media[entry.name] = file_record(entry.path, previous_media.get(entry.name), entry.stat())
+    return dict(sorted(media.items()))
+
+def scan_location(download_directory, previous_posts, catalog_posts=None):
+    """Returns a manifest record per catalogued post: its directory mtime, content hash and media files.
+
+    The posts and their content hashes come from the catalog in one read;
+    the location directory is listed once with os.scandir. A post directory
+    whose mtime matches its previous record keeps its media records without
+    being opened: the crawler links media in under temporary names and
+    renames them, so any change moves the directory mtime. Files edited in
+    place by hand need a full build.
+    """
+    if catalog_posts is None:
+        catalog_posts = read_location(os.path.basename(os.path.normpath(download_directory)))
+    try:
+        with os.scandir(download_directory) as entries:
+            post_entries = {entry.name: entry for entry in entries if entry.is_dir()}
+    except (FileNotFoundError, NotADirectoryError):
+        post_entries = {}
+    posts = {}
+    for post_dir, post in catalog_posts.items():
+        previous = previous_posts.get(post_dir, {})
+        entry = post_entries.get(post_dir)
+        mtime = entry.stat().st_mtime_ns if entry else None
+        if entry is None:
+            media = {}
+        elif previous.get("mtime") == mtime:
+            media = previous["media"]
+        else:
+            media = scan_post(entry.path, previous)
+        posts[post_dir] = {"mtime": mtime, "content": {"sha256": post["content_hash"]}, "media": media}
+    return posts
+
+def generator_version():
+    """Hash of this generator, so template changes invalidate every page."""
+    return file_sha256(os.path.abspath(__file__))
+
+def location_fingerprint(location_directory, dir_list, posts, version, page_size=0, media_meta=None):
+    payload = json.dumps(
+        [version, location_directory, dir_list, page_size, media_meta or {}, {
+            post_dir: [record["content"]["sha256"], sorted(
+                (name, media["sha256"]) for name, media in record["media"].items()
+            )]
+            for post_dir, record in posts.items()
+        }],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(temp_file, path)
+
+def replace_if_changed(temp_file, output_file):
+    """Moves temp_file over output_file unless their bytes are identical; returns True if replaced."""
+    if os.path.exists(output_file) and filecmp.cmp(temp_file, output_file, shallow=False):
+        os.remove(temp_file)
+        return False
+    os.replace(temp_file, output_file)
+    return True
+
+def location_media(download_directory, post_records, dimensions):
+    """Maps each media path of a location to its shared copy, known size and the thumbnails already built for it."""
+    media_meta = {}
+    for post_dir, record in post_records.items():
+        for name, media in record["media"].items():
+            kind = media_kind(name)
+            meta = dict(kind and existing_thumbnails(media["sha256"], kind) or {})
+            stored = os.path.join(MEDIA_STORE, media["sha256"] + os.path.splitext(name)[1].lower())
+            if os.path.exists(stored):
+                meta["src"] = os.path.relpath(stored, "html")
+            if dimensions.get(media["sha256"]):
+                meta["size"] = dimensions[media["sha256"]]
+            if meta.get("srcset") and meta["srcset"][-1][1] < THUMB_WIDTHS[-1]:
+                # Only the smaller buckets fit inside the image; offer the original too rather than upscale them
+                if not meta.get("size"):
+                    del meta["srcset"]
+                elif meta["size"][0] > meta["srcset"][-1][1]:
+                    src = meta.get("src") or os.path.relpath(os.path.join(download_directory, post_dir, name), "html")
+                    meta["srcset"] = meta["srcset"] + [(src, meta["size"][0])]
+            if meta:
+                media_meta[os.path.join(download_directory, post_dir, name)] = meta
+    return media_meta
+
+def dimension_jobs(scans, dimensions):
+    """(source, kind) for every distinct media file whose size is not in the dimensions index yet."""
+    jobs = {}
+    for location_directory, post_records in scans.items():
+        for post_dir, record in post_records.items():
+            for name, media in record["media"].items():
+                kind = media_kind(name)
+                if media["sha256"] not in dimensions and media["sha256"] not in jobs and can_probe(kind):
+                    jobs[media["sha256"]] = (os.path.join("html", location_directory, post_dir, name), kind)
+    return jobs
+
+def thumbnail_jobs(scans):
+    """(source, sha256, kind) for every media file still missing its thumbnails, one per distinct file."""
+    jobs = {}
+    skipped = set()
+    for location_directory, post_records in scans.items():
+        for post_dir, record in post_records.items():
+            for name, media in record["media"].items():
+                kind = media_kind(name)
+                if kind not in ("image", "video") or media["sha256"] in jobs or existing_thumbnails(media["sha256"], kind):
+                    continue
+                if not can_make(kind):
+                    skipped.add(kind)
+                    continue
+                jobs[media["sha256"]] = (os.path.join("html", location_directory, post_dir, name), media["sha256"], kind)
+    if "image" in skipped:
+        print("Pillow is not installed; images are shown without thumbnails")
+    if "video" in skipped:
+        print("ffmpeg was not found; videos are shown without poster frames")
+    return list(jobs.values())
+
+def search_terms(text):
+    """Index terms of text: Latin words and digits, and each CJK run as overlapping character pairs.
+
+    The last character of a run is kept on its own too, so a one-character
+    query (matched by prefix in SITE_JS) finds it wherever it occurs.
+    """
+    terms = set()
+    for run in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()):
+        if run[0].isascii() or len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+            terms.add(run[-1])
+    return terms
+
+def build_search_shard(location_directory, post_records, catalog_posts):
+    """Inverted index of one location: post titles and text, mapped to positions in a post list."""
+    posts = []
+    terms = {}
+    for post_dir in post_records:
+        content = catalog_posts[post_dir]["content"]
+        title, _, body = content.strip().partition("\n")
+        for term in search_terms(content):
+            terms.setdefault(term, []).append(len(posts))
+        posts.append([post_dir, title, " ".join(body.split())[:SEARCH_SNIPPET]])
+    return {"location": location_directory, "posts": posts, "terms": dict(sorted(terms.items()))}
+
+def search_shard_path(location_directory):
+    return os.path.join(SEARCH_DIR, f"{location_directory}.json")
+
+def write_search_shard(location_directory, post_records, catalog_posts):
+    shard_file = search_shard_path(location_directory)
+    with open(shard_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(build_search_shard(location_directory, post_records, catalog_posts), f,
+                  ensure_ascii=False, separators=(",", ":"))
+    replace_if_changed(shard_file + ".tmp", shard_file)
+
+def write_search_index(dir_list):
+    """Lists the location shards for the search box, versioned by content so browsers refetch changed ones."""
+    shards = [
+        {"location": location_directory,
+         "file": f"{os.path.relpath(search_shard_path(location_directory), 'html')}?v={file_sha256(search_shard_path(location_directory))[:12]}"}
+        for location_directory in dir_list
+        if os.path.exists(search_shard_path(location_directory))
+    ]
+    index_file = os.path.join(SEARCH_DIR, "index.json")
+    with open(index_file + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"shards": shards}, f, ensure_ascii=False)
+    replace_if_changed(index_file + ".tmp", index_file)
+
+def build_location(location_directory, dir_list, post_records, dimensions, previous_fingerprint, version, page_size=PAGE_SIZE):
+    """Builds one location page; returns (fingerprint, status, seconds)."""
+    started = time.perf_counter()
+    download_directory = os.path.join("html/", location_directory)
+    media_meta = location_media(download_directory, post_records, dimensions)
+    fingerprint = location_fingerprint(location_directory, dir_list, post_records, version, page_size, media_meta)
+    output_file = f"{download_directory}.html"
+
+    if previous_fingerprint == fingerprint and os.path.exists(output_file) and os.path.exists(search_shard_path(location_directory)):
+        status = "unchanged"
+    else:
+        # One sequential read of the location's posts serves both the page and its search shard
+        catalog_posts = read_location(location_directory)
+        posts = iter_posts(download_directory, media_meta, post_records, catalog_posts)
+        
+        # Always generate HTML, regardless of whether posts are found
+        write_page(output_file + ".tmp", posts, location_directory, dir_list, page_size, download_directory)
+        status = "written" if replace_if_changed(output_file + ".tmp", output_file) else "identical"
+        write_search_shard(location_directory, post_records, catalog_posts)
+
+    return fingerprint, status, time.perf_counter() - started
+
+def run_jobs(executor, function, jobs):
+    """Runs function over the argument tuples in jobs, on executor if there is one; results keep job order."""
+    if executor is None:
+        return [function(*job) for job in jobs]
+    return list(executor.map(function, *zip(*jobs))) if jobs else []
+
+def precompress_site(executor):
+    """Writes .gz (and .br) siblings of the pages, chunks, assets and search shards that changed."""
+    jobs = compression_jobs(["html", SEARCH_DIR])
+    if not jobs:
+        return
+    if brotli is None:
+        print("brotli is not installed; writing .gz siblings only")
+    compress_started = time.perf_counter()
+    results = run_jobs(executor, compress_file, jobs)
+    original = sum(size for size, _ in results)
+    compressed = sum(sizes[".gz"] for _, sizes in results)
+    print(f"Compressed {len(jobs)} files ({original / 1024:.0f} KiB, {compressed / 1024:.0f} KiB gzipped) "
+          f"in {time.perf_counter() - compress_started:.2f}s")
+
+def build_site(dir_list, full=False, workers=None, page_size=PAGE_SIZE, compress=True):
+    """Generates html/<location>.html for every location, plus html/index.html.
+
+    The build runs in three passes on one process pool of `workers`
+    processes (1 builds in this process): scan every location's posts and
+    media, probe the sizes and make the thumbnails and poster frames still
+    missing, then render the pages and their search shards. Sizes are kept
+    in the dimensions index, so each distinct file is probed once. Each
+    page holds the first page_size posts and loads the rest in chunks as
+    the reader scrolls. Locations whose posts, media, thumbnails and
+    generator are unchanged since the last build (per the manifest) are
+    skipped, and pages that render to the same bytes are not rewritten.
+    With compress, a last pass writes precompressed siblings of the files
+    that changed; without it, siblings left from earlier builds are removed.
+    full=True rebuilds everything.
+    """
+    os.makedirs(SEARCH_DIR, exist_ok=True)
+    # Shared assets are written once per build
+    shutil.copy('icon-play.png', "html/")
+    write_static_assets("html")
+
+    manifest = {} if full else load_manifest()
+    previous_locations = manifest.get("locations", {})
+    version = generator_version()
+    started = time.perf_counter()
+
+    pool = contextlib.nullcontext() if workers == 1 else concurrent.futures.ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    with pool as executor:
+        scans = dict(zip(dir_list, run_jobs(executor, scan_location, [
+            (os.path.join("html/", location_directory),
+             previous_locations.get(location_directory, {}).get("posts", {}))
+            for location_directory in dir_list
+        ])))
+
+        dimensions = load_dimensions()
+        probes = dimension_jobs(scans, dimensions)
+        if probes:
+            dimensions.update(zip(probes, run_jobs(executor, probe_dimensions, list(probes.values()))))
+            save_dimensions(dimensions)
+
+        jobs = thumbnail_jobs(scans)
+        if jobs:
+            thumbnails_started = time.perf_counter()
+            errors = [error for error in run_jobs(executor, make_thumbnails, jobs) if error]
+            for error in errors:
+                print(error)
+            print(f"Made thumbnails for {len(jobs) - len(errors)} of {len(jobs)} media files in {time.perf_counter() - thumbnails_started:.2f}s")
+
+        results = run_jobs(executor, build_location, [
+            (location_directory, dir_list, scans[location_directory], dimensions,
+             previous_locations.get(location_directory, {}).get("fingerprint"), version, page_size)
+            for location_directory in dir_list
+        ])
+
+        locations = {}
+        for location_directory, (fingerprint, status, seconds) in zip(dir_list, results):
+            post_records = scans[location_directory]
+            locations[location_directory] = {"fingerprint": fingerprint, "posts": post_records}
+            print(f"{location_directory}: {status}, {len(post_records)} posts, {seconds:.2f}s")
+            if not post_records:
+                print(f"No posts were found in {CATALOG_PATH} for {location_directory} "
+                      f"(crawl.py --import-posts moves posts from older crawls there)")
+
+        # Copy the first generated HTML file to index.html
+        if dir_list:
+            output_file = f"html/{dir_list[0]}.html"
+            if not os.path.exists("html/index.html") or not filecmp.cmp(output_file, "html/index.html", shallow=False):
+                shutil.copy(output_file, "html/index.html")
+
+        write_search_index(dir_list)
+        if compress:
+            precompress_site(executor)
+        elif remove_siblings(["html", SEARCH_DIR]):
+            print("Removed the precompressed siblings of an earlier build")
+    save_manifest({"locations": locations})
+    print(f"Built {len(dir_list)} locations in {time.perf_counter() - started:.2f}s")
 
 if __name__ == "__main__":
     # Specify the directories to process
@@ -437,26 +1148,13 @@ if __name__ == "__main__":
         "蘆洲定點","信義定點","基隆定點","汐止定點",
         "永和定點","中和定點","新店定點","樹林定點",
     ]
-    first_html_generated = False
-    for location_directory in dir_list:
-        download_directory = os.path.join("html/", location_directory)
-        print("Processing directories:", download_directory)
-
-        all_posts = []
-        if os.path.exists(download_directory) and os.path.isdir(download_directory):
-            main(download_directory, all_posts)
-        
-        # Always generate HTML, regardless of whether posts are found
-        html_content = generate_html(all_posts, location_directory, dir_list)
-        output_file = f"{download_directory}.html"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        
-        if not all_posts:
-            print(f"No posts were found in the specified directory: {download_directory}")
-
-        shutil.copy('icon-play.png', "html/")
-        # Copy the first generated HTML file to index.html
-        if not first_html_generated:
-            shutil.copy(output_file, "html/index.html")
-            first_html_generated = True
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the location pages under html/.")
+    parser.add_argument("--full", action="store_true", help="ignore the build manifest and rebuild every page")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for scanning, thumbnails, rendering and compression (default: CPU count, 1 to build serially)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help=f"posts per page and per lazily loaded chunk, 0 for one full page (default: {PAGE_SIZE})")
+    parser.add_argument("--no-compress", dest="compress", action="store_false",
+                        help="skip writing .gz/.br siblings of the generated files")
+    args = parser.parse_args()
+    build_site(dir_list, full=args.full, workers=args.workers, page_size=args.page_size, compress=args.compress)
@@ -0,0 +1,81 @@
+import os
+import json
+import shutil
+import struct
+import subprocess
+
+# Intrinsic size of every media file seen by the generator, keyed by its SHA-256
+DIMENSIONS_PATH = os.path.join("html", "media_dimensions.json")
+
+# JPEG start-of-frame markers (0xC4, 0xC8 and 0xCC are other segments)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Markers may be padded with extra 0xFF bytes
+        while marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+            if len(marker) < 2:
+                return None  # Truncated inside the padding
+        if 0xD0 <= marker[1] <= 0xD9 or marker[1] == 0x01:
+            continue
+        length = struct.unpack(">H", f.read(2))[0]
+        if marker[1] in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+def image_size(path):
+    """(width, height) from the header of a JPEG, PNG or GIF, or None."""
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", head[6:10])
+        if head[:2] == b"\xff\xd8":
+            return jpeg_size(f)
+    return None
+
+def video_size(path):
+    """(width, height) of the first video stream according to ffprobe, or None."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0",
+         "-show_entries", "stream=width,height", "-of", "csv=p=0:s=x", path],
+        capture_output=True, text=True,
+    )
+    width, _, height = result.stdout.strip().partition("x")
+    if result.returncode == 0 and width.isdigit() and height.isdigit():
+        return int(width), int(height)
+    return None
+
+def can_probe(kind):
+    if kind == "video":
+        return shutil.which("ffprobe") is not None
+    return kind is not None
+
+def probe_dimensions(path, kind):
+    """Intrinsic [width, height] of a media file of the given media_kind, or None if it cannot be read."""
+    try:
+        size = video_size(path) if kind == "video" else image_size(path)
+    except (OSError, struct.error, IndexError, ValueError):
+        # Truncated or corrupt headers count as an unknown size
+        return None
+    return list(size) if size and all(size) else None
+
+def load_dimensions(path=DIMENSIONS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_dimensions(dimensions, path=DIMENSIONS_PATH):
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf-8") as f:
+        json.dump(dimensions, f, sort_keys=True)
+    os.replace(temp_file, path)
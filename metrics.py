@@ -0,0 +1,157 @@
+import collections
+import contextlib
+import contextvars
+import json
+import threading
+import time
+
+import aiohttp
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+# Tags of the code currently running; asyncio tasks and to_thread calls inherit them
+_current_tags = contextvars.ContextVar('metrics_tags', default={})
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Metrics:
+    """Counters and latency histograms for a crawl.
+
+    Every event carries the tags set by the enclosing tagged() blocks (e.g.
+    location and number) and, once start() has been called with a path, is
+    appended to that file as one JSON object per line.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self.reset()
+
+    def reset(self):
+        self.counters = collections.Counter()
+        self.timings = collections.defaultdict(list)
+        self.started = time.monotonic()
+
+    def start(self, path=None):
+        """Clears previous measurements and starts exporting events to path."""
+        self.close()
+        self.reset()
+        if path:
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _emit(self, event):
+        if self._file is not None:
+            event['ts'] = round(time.time(), 6)
+            self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    @contextlib.contextmanager
+    def tagged(self, **tags):
+        token = _current_tags.set({**_current_tags.get(), **tags})
+        try:
+            yield
+        finally:
+            _current_tags.reset(token)
+
+    def count(self, name, value=1, **tags):
+        with self._lock:
+            self.counters[name] += value
+            self._emit({'metric': name, 'type': 'counter', 'value': value, **_current_tags.get(), **tags})
+
+    def observe(self, name, seconds, **tags):
+        with self._lock:
+            self.timings[name].append(seconds)
+            self._emit({'metric': name, 'type': 'timing', 'seconds': round(seconds, 6),
+                        **_current_tags.get(), **tags})
+
+    @contextlib.contextmanager
+    def timer(self, name, **tags):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **tags)
+
+    def snapshot(self):
+        """The counters and timings recorded since the last reset, picklable for another process."""
+        with self._lock:
+            return {'counters': dict(self.counters), 'timings': dict(self.timings)}
+
+    def merge(self, snapshot):
+        """Adds the counters and timings of a snapshot() taken in another process."""
+        with self._lock:
+            self.counters.update(snapshot['counters'])
+            for name, values in snapshot['timings'].items():
+                self.timings[name].extend(values)
+
+    def trace_config(self):
+        """aiohttp hooks recording DNS, connect and time-to-first-byte per request."""
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, context, params):
+            context.request_started = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            # Fired once the response headers have arrived
+            self.observe('ttfb', time.perf_counter() - context.request_started)
+
+        async def on_dns_start(session, context, params):
+            context.dns_started = time.perf_counter()
+
+        async def on_dns_end(session, context, params):
+            self.observe('dns', time.perf_counter() - context.dns_started)
+
+        async def on_connect_start(session, context, params):
+            context.connect_started = time.perf_counter()
+
+        async def on_connect_end(session, context, params):
+            self.observe('connect', time.perf_counter() - context.connect_started)
+
+        async def on_connection_reused(session, context, params):
+            self.count('connections_reused')
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_dns_resolvehost_start.append(on_dns_start)
+        trace_config.on_dns_resolvehost_end.append(on_dns_end)
+        trace_config.on_connection_create_start.append(on_connect_start)
+        trace_config.on_connection_create_end.append(on_connect_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reused)
+        return trace_config
+
+    def histogram(self, name):
+        counts = [0] * len(BUCKETS)
+        for seconds in self.timings[name]:
+            counts[next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)] += 1
+        return dict(zip((str(bound) for bound in BUCKETS), counts))
+
+    def summary(self):
+        """Prints the end-of-run table and writes it as the last JSON line."""
+        elapsed = time.monotonic() - self.started
+        rows = []
+        print(f"\n{'stage':<16} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'total s':>9}")
+        for name, values in sorted(self.timings.items()):
+            row = {
+                'metric': name, 'count': len(values),
+                'p50': percentile(values, 0.5), 'p90': percentile(values, 0.9),
+                'p99': percentile(values, 0.99), 'max': max(values), 'total': sum(values),
+                'histogram': self.histogram(name),
+            }
+            rows.append(row)
+            print(f"{name:<16} {row['count']:>7} {row['p50'] * 1000:>9.1f} {row['p90'] * 1000:>9.1f} "
+                  f"{row['p99'] * 1000:>9.1f} {row['max'] * 1000:>9.1f} {row['total']:>9.2f}")
+        print(f"\n{'counter':<24} {'value':>10}")
+        for name, value in sorted(self.counters.items()):
+            print(f"{name:<24} {value:>10}")
+        print(f"\nElapsed: {elapsed:.1f}s")
+        with self._lock:
+            self._emit({'type': 'summary', 'elapsed': elapsed, 'timings': rows, 'counters': dict(self.counters)})
@@ -0,0 +1,94 @@
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Served text files that get .gz (and, with the brotli package, .br) siblings
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.json')
+# Build bookkeeping under html/ that is never served to readers
+INTERNAL_FILES = {'build_manifest.json', 'media_dimensions.json'}
+# Below this size the compressed file saves less than a packet
+MIN_SIZE = 1024
+
+def encodings():
+    """(suffix, compress function) for every available encoding."""
+    available = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        available.append(('.br', lambda data: brotli.compress(data, quality=11)))
+    return available
+
+def compressible(name):
+    return name.endswith(COMPRESSIBLE_EXTENSIONS) and name not in INTERNAL_FILES
+
+def up_to_date(path, stat):
+    """True if every sibling of path carries the source's mtime, i.e. was made from this version."""
+    for suffix, _ in encodings():
+        try:
+            if os.stat(path + suffix).st_mtime_ns != stat.st_mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+    return True
+
+def compression_jobs(directories):
+    """Paths in directories whose compressed siblings are missing or older than the file.
+
+    Also removes siblings whose served source file is gone; other .gz/.br
+    files, such as archives kept next to the crawl data, are left alone.
+    """
+    jobs = []
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+        names = {entry.name for entry in entries}
+        for entry in entries:
+            if entry.name.endswith(('.gz', '.br')):
+                if compressible(entry.name[:-3]) and entry.name[:-3] not in names:
+                    os.remove(entry.path)
+                continue
+            if not entry.is_file() or not compressible(entry.name):
+                continue
+            stat = entry.stat()
+            if stat.st_size < MIN_SIZE:
+                for suffix, _ in encodings():
+                    if entry.name + suffix in names:
+                        os.remove(entry.path + suffix)
+            elif not up_to_date(entry.path, stat):
+                jobs.append((entry.path,))
+    return jobs
+
+def remove_siblings(directories):
+    """Deletes the .gz and .br siblings in directories, for builds that skip compression.
+
+    A server that prefers precompressed files only checks that the sibling
+    exists, so one left from an earlier build would be served instead of
+    the new file.
+    """
+    removed = 0
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(('.gz', '.br')) and compressible(entry.name[:-3]) and entry.is_file():
+                    os.remove(entry.path)
+                    removed += 1
+    return removed
+
+def compress_file(path):
+    """Writes path.gz and path.br next to path; returns (original size, sizes of the siblings written)."""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    sizes = {}
+    for suffix, compress in encodings():
+        compressed = compress(data)
+        target = path + suffix
+        with open(target + '.tmp', 'wb') as f:
+            f.write(compressed)
+        # The sibling takes the source's mtime, which marks it as made from this version
+        os.utime(target + '.tmp', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(target + '.tmp', target)
+        sizes[suffix] = len(compressed)
+    return len(data), sizes
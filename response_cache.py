@@ -0,0 +1,87 @@
+import os
+import time
+import zlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+from sqlite_store import open_sqlite
+
+CACHE_PATH = os.path.join('html', 'http_cache.sqlite')
+# Responses younger than this many seconds are served without a request
+CACHE_TTL = 3600
+# Least recently used responses are evicted beyond this many stored (compressed) bytes
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+class CacheMiss(Exception):
+    """Raised in offline mode for a URL that has no cached response."""
+
+def normalize_url(url):
+    """Cache key for url: lower-case scheme and host, sorted and uniformly quoted query, no fragment.
+
+    The fragment is dropped because clients never send it, so two URLs that
+    differ only after a '#' fetch the same response.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), quote_via=quote)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+class ResponseCache:
+    """SQLite store of page responses, keyed by normalized URL, with a TTL and LRU eviction by size."""
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.connection = open_sqlite(path)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )"""
+        )
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)')
+        self.connection.commit()
+
+    def get(self, url, ignore_ttl=False):
+        """The cached response for url as a dict with body, etag and last_modified, or None.
+
+        Responses older than the TTL count as missing unless ignore_ttl is set.
+        """
+        key = normalize_url(url)
+        row = self.connection.execute(
+            'SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?', (key,)
+        ).fetchone()
+        if row is None or (not ignore_ttl and time.time() - row[3] > self.ttl):
+            return None
+        self.connection.execute('UPDATE responses SET used_at = ? WHERE url = ?', (time.time(), key))
+        self.connection.commit()
+        return {'body': zlib.decompress(row[0]).decode('utf-8'), 'etag': row[1], 'last_modified': row[2]}
+
+    def put(self, url, body, etag=None, last_modified=None):
+        compressed = zlib.compress(body.encode('utf-8'))
+        now = time.time()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (normalize_url(url), compressed, etag, last_modified, len(compressed), now, now)
+        )
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """Deletes least recently used responses until the store fits in max_bytes."""
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self.connection.execute(
+            'SELECT url, size FROM responses ORDER BY used_at'
+        ).fetchall():
+            self.connection.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def close(self):
+        self.connection.close()
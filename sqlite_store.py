@@ -0,0 +1,13 @@
+import os
+import sqlite3
+
+def open_sqlite(path):
+    """Connects to the SQLite database at path in WAL mode, creating its directory first.
+
+    WAL lets process-pool workers read while another one writes, and the
+    timeout makes a writer wait for a lock instead of failing.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
@@ -0,0 +1,98 @@
+import os
+import shutil
+import subprocess
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Grid thumbnails live here, named after the SHA-256 of their source file
+THUMB_DIR = os.path.join("html", "thumbs")
+# Widths of the srcset buckets for images
+THUMB_WIDTHS = (320, 640)
+POSTER_WIDTH = 640
+JPEG_QUALITY = 80
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# GIFs may be animated, so they are always shown as they are, without thumbnails
+ANIMATION_EXTENSIONS = ('.gif',)
+VIDEO_EXTENSIONS = ('.mp4', '.webm')
+
+def media_kind(name):
+    """'image', 'animation' (GIFs) or 'video'; None for anything else.
+
+    Only images and videos get thumbnails, but every kind has its size probed.
+    """
+    name = name.lower()
+    if name.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    if name.endswith(ANIMATION_EXTENSIONS):
+        return "animation"
+    if name.endswith(VIDEO_EXTENSIONS):
+        return "video"
+    return None
+
+def thumbnail_path(sha256, suffix):
+    return os.path.join(THUMB_DIR, sha256[:2], f"{sha256}-{suffix}.jpg")
+
+def existing_thumbnails(sha256, kind):
+    """Thumbnails already built for a source, as paths relative to html/.
+
+    Images map to a list of (path, width) srcset entries, videos to a poster path.
+    """
+    if kind == "image":
+        entries = [
+            (os.path.relpath(thumbnail_path(sha256, width), "html"), width)
+            for width in THUMB_WIDTHS
+            if os.path.exists(thumbnail_path(sha256, width))
+        ]
+        return {"srcset": entries} if entries else None
+    if kind == "video" and os.path.exists(thumbnail_path(sha256, "poster")):
+        return {"poster": os.path.relpath(thumbnail_path(sha256, "poster"), "html")}
+    return None
+
+def can_make(kind):
+    if kind == "image":
+        return Image is not None
+    if kind == "video":
+        return shutil.which("ffmpeg") is not None
+    return False
+
+def make_image_thumbnails(source, sha256):
+    with Image.open(source) as image:
+        image = image.convert("RGB")
+        # Never upscale; a small image still gets its smallest bucket
+        widths = [width for width in THUMB_WIDTHS if width < image.width] or [THUMB_WIDTHS[0]]
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, width * 4))
+            path = thumbnail_path(sha256, width)
+            resized.save(path + ".tmp", "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            os.replace(path + ".tmp", path)
+
+def make_video_poster(source, sha256):
+    path = thumbnail_path(sha256, "poster")
+    # One second in skips black lead-in frames; very short clips fall back to the first frame
+    for offset in ("1", "0"):
+        result = subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-ss", offset, "-i", source, "-frames:v", "1",
+             "-vf", f"scale='min({POSTER_WIDTH},iw)':-2", "-f", "image2", path + ".tmp"],
+            capture_output=True,
+        )
+        if result.returncode == 0 and os.path.exists(path + ".tmp") and os.path.getsize(path + ".tmp"):
+            os.replace(path + ".tmp", path)
+            return
+    raise RuntimeError(result.stderr.decode("utf-8", "replace").strip() or "ffmpeg produced no frame")
+
+def make_thumbnails(source, sha256, kind):
+    """Builds the thumbnails for one source file; returns an error message, or None on success."""
+    try:
+        os.makedirs(os.path.dirname(thumbnail_path(sha256, "poster")), exist_ok=True)
+        if kind == "image":
+            make_image_thumbnails(source, sha256)
+        else:
+            make_video_poster(source, sha256)
+    except Exception as e:
+        return f"Failed to make thumbnails for {source}: {e}"
+    return None